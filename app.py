@@ -1,13 +1,27 @@
-from flask import Flask, jsonify, request, render_template, redirect, url_for
+from flask import Flask, jsonify, request, render_template, redirect, url_for, Response, stream_with_context
 from flask_cors import CORS
 import stripe
 import os
 from dotenv import load_dotenv
 import firebase_admin
 from firebase_admin import credentials, auth, firestore
+from caching import TTLCache, create_explanation_cache
+from datastore import create_datastore
+from storage import NOW, create_storage
+from webhook_queue import WebhookQueue
+from generation import GenerationPipeline, GenerationOverloaded, GenerationTimeout, create_backend
+from extraction import extract_main_text
+from summarization import summarize
+from dedup import NearDuplicateIndex, card_bands, card_similarity
 import json
 import time
 import logging
+import hashlib
+import base64
+import threading
+import queue
+import atexit
+import concurrent.futures
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, 
@@ -23,30 +37,46 @@ if not os.getenv('STRIPE_SECRET_KEY'):
 if not os.getenv('STRIPE_PUBLISHABLE_KEY'):
     raise ValueError("Missing STRIPE_PUBLISHABLE_KEY in environment variables")
 
-# Initialize Firebase Admin with error handling
-try:
-    logger.info("Initializing Firebase Admin SDK...")
-    cred = credentials.Certificate('backend/service_acc.json')
-    firebase_admin.initialize_app(cred)
-    db = firestore.client()
-    
-    # Test Firestore connection
-    try:
-        logger.info("Testing Firestore connection...")
-        test_doc = db.collection('test_collection').document('test_document')
-        test_doc.set({'test': 'data'})
-        logger.info("Firestore connection successful!")
-    except Exception as e:
-        logger.error(f"Error connecting to Firestore: {str(e)}")
-        logger.error("This may indicate that Firestore is not enabled for your project.")
-        logger.error("Please visit the Firebase console and enable Firestore for this project.")
-        if "403" in str(e) and "not been used" in str(e):
-            logger.error("SOLUTION: Go to https://console.firebase.google.com/project/eli5-322a1/firestore")
-            logger.error("and click 'Create database' to enable Firestore for this project.")
-except Exception as e:
-    logger.error(f"Firebase initialization error: {str(e)}")
-    # Continue running the app even if Firebase fails
-    db = None
+# Firebase Admin is initialized lazily, once per process, on first use. This
+# keeps imports fast and lets preforking servers fork before any gRPC channel
+# exists; a worker that inherits an app from its parent re-creates it.
+SERVICE_ACCOUNT_PATH = os.getenv('SERVICE_ACCOUNT_PATH', 'backend/service_acc.json')
+_firebase_lock = threading.Lock()
+_firebase_pid = None
+_db = None
+
+def get_db():
+    """Return this process's Firestore client, or None if Firebase failed to initialize."""
+    global _firebase_pid, _db
+    if _firebase_pid == os.getpid():
+        return _db
+    with _firebase_lock:
+        if _firebase_pid == os.getpid():
+            return _db
+        try:
+            logger.info("Initializing Firebase Admin SDK...")
+            try:
+                # Drop an app (and its channels) inherited across fork
+                firebase_admin.delete_app(firebase_admin.get_app())
+            except ValueError:
+                pass
+            cred = credentials.Certificate(SERVICE_ACCOUNT_PATH)
+            firebase_admin.initialize_app(cred)
+            _db = firestore.client()
+        except Exception as e:
+            logger.error(f"Firebase initialization error: {str(e)}")
+            # Continue running the app even if Firebase fails
+            _db = None
+        _firebase_pid = os.getpid()
+        return _db
+
+# All Firestore I/O goes through the datastore: one client per process, shared
+# timeout/retry policy and per-route call metrics
+datastore = create_datastore(get_db)
+
+# Users, flashcards and history are persisted through the storage backend
+# selected by STORAGE_BACKEND: Firestore (default) or a local SQLite file
+storage = create_storage(datastore)
 
 app = Flask(__name__, template_folder='templates')
 CORS(app)
@@ -65,6 +95,339 @@ logger.info(f"Secret Key: {stripe.api_key[:8]}... ({'TEST MODE' if is_test_mode
 logger.info(f"Publishable Key: {STRIPE_PUBLISHABLE_KEY[:8]}...")
 logger.info(f"Domain: {DOMAIN}")
 
+# Cache of verified Firebase ID tokens so repeat requests skip signature checks
+class TokenCache:
+    """Caches decoded ID token claims by token hash until the token expires."""
+
+    def __init__(self, max_size=10000, negative_ttl=60):
+        self.negative_ttl = negative_ttl
+        self._cache = TTLCache(max_size=max_size)
+        self.negative_hits = 0
+
+    def verify(self, token):
+        """Return decoded claims for token, verifying with Firebase on a miss."""
+        key = hashlib.sha256(token.encode('utf-8')).hexdigest()
+        cached = self._cache.get(key)
+        if cached is not None:
+            claims, error = cached
+            if error is not None:
+                self.negative_hits += 1
+                raise ValueError(error)
+            return claims
+
+        try:
+            get_db()  # Make sure Firebase Admin is initialized in this process
+            decoded_token = auth.verify_id_token(token)
+        except (auth.InvalidIdTokenError, ValueError) as e:
+            # Only cache definite rejections, never transient key-fetch failures
+            self._cache.set(key, (None, str(e)), ttl=self.negative_ttl)
+            raise
+        self._cache.set(key, (decoded_token, None),
+                        expires_at=decoded_token.get('exp', time.time()))
+        return decoded_token
+
+    def stats(self):
+        stats = self._cache.stats()
+        stats['negative_hits'] = self.negative_hits
+        return stats
+
+token_cache = TokenCache(
+    max_size=int(os.getenv('TOKEN_CACHE_SIZE', '10000')),
+    negative_ttl=int(os.getenv('TOKEN_CACHE_NEGATIVE_TTL', '60'))
+)
+
+# Cache of subscription entitlements so premium checks skip the user document read
+class EntitlementCache:
+    """Caches each user's subscription data and deck version for a short TTL.
+
+    Anything that writes a user's subscription or flashcards must call
+    invalidate(). Each entry carries a version hashed from the subscription,
+    used as an ETag, and the user document's flashcards_version counter.
+    """
+
+    def __init__(self, max_size=10000, ttl=60):
+        self._cache = TTLCache(max_size=max_size, ttl=ttl)
+
+    def _entry(self, user_id, refresh=False):
+        entitlement = None if refresh else self._cache.get(user_id)
+        if entitlement is None:
+            user_data = storage.get_user(user_id)
+            if user_data is not None:
+                user_exists, subscription = True, user_data.get('subscription', {})
+            else:
+                user_exists, subscription, user_data = False, {}, {}
+            content = json.dumps([user_exists, subscription], sort_keys=True, default=str)
+            version = hashlib.sha256(content.encode('utf-8')).hexdigest()[:16]
+            entitlement = (user_exists, subscription, version, user_data.get('flashcards_version', 0))
+            self._cache.set(user_id, entitlement)
+        return entitlement
+
+    def get_versioned(self, user_id):
+        """Return (user_exists, subscription, version) from a single cache entry."""
+        return self._entry(user_id)[:3]
+
+    def flashcards_version(self, user_id, refresh=False):
+        """Return the user's stored flashcards_version; refresh=True re-reads the user document."""
+        return self._entry(user_id, refresh=refresh)[3]
+
+    def get(self, user_id):
+        """Return (user_exists, subscription) for user_id, reading storage on a miss."""
+        return self.get_versioned(user_id)[:2]
+
+    def is_active(self, user_id):
+        user_exists, subscription = self.get(user_id)
+        return user_exists and subscription.get('status') == 'active'
+
+    def invalidate(self, user_id):
+        if user_id:
+            self._cache.delete(user_id)
+
+    def stats(self):
+        return self._cache.stats()
+
+entitlement_cache = EntitlementCache(
+    max_size=int(os.getenv('ENTITLEMENT_CACHE_SIZE', '10000')),
+    ttl=int(os.getenv('ENTITLEMENT_CACHE_TTL', '60'))
+)
+
+def make_etag(*parts):
+    """Build a strong ETag value from a version token and the request parameters."""
+    raw = json.dumps(parts, separators=(',', ':'), default=str).encode('utf-8')
+    return hashlib.sha256(raw).hexdigest()[:32]
+
+def with_etag(response, etag):
+    # Clients must revalidate every time; the response is per-user
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def not_modified(etag):
+    """Return an empty 304 response if the request's If-None-Match matches etag, else None."""
+    if request.if_none_match.contains(etag):
+        return with_etag(Response(status=304), etag)
+    return None
+
+# Background writer for best-effort explanation history
+class WriteBehindQueue:
+    """Bounded queue of explanation history writes, flushed by a pool of workers.
+
+    Each worker collects up to batch_size entries (or whatever arrives within
+    flush_interval seconds) and writes them with one storage.add_history call,
+    which merges the per-user stats increments. When the queue is full,
+    entries are dropped rather than blocking the request.
+    """
+
+    def __init__(self, max_size=10000, workers=2, batch_size=200, flush_interval=1.0):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_size)
+        self._start_lock = threading.Lock()
+        self._pid = None
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+
+    def _ensure_started(self):
+        # Threads don't survive fork, so (re)start them once per process
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            for i in range(self.workers):
+                threading.Thread(target=self._run, name=f'history-writer-{i}', daemon=True).start()
+            self._pid = os.getpid()
+
+    def put(self, user_id, history_item):
+        """Queue a history entry for user_id. Returns False if it was dropped."""
+        return self.put_many(user_id, [history_item])
+
+    def put_many(self, user_id, history_items):
+        """Queue several history entries for user_id; they are flushed together."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((user_id, history_items))
+        except queue.Full:
+            self.dropped += len(history_items)
+            logger.warning(f"History queue full - dropped explanation history for {user_id}")
+            return False
+        self.enqueued += len(history_items)
+        return True
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._flush(batch)
+
+    def _flush(self, batch):
+        entries = sum(len(history_items) for _, history_items in batch)
+        try:
+            storage.add_history(batch)
+            self.written += entries
+        except Exception as e:
+            self.failed += entries
+            logger.error(f"Error saving explanation history: {str(e)}")
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    def drain(self, timeout=5.0):
+        """Wait up to timeout seconds for queued entries to be written."""
+        deadline = time.time() + timeout
+        while self._queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.05)
+
+    def stats(self):
+        return {
+            'depth': self._queue.qsize(),
+            'enqueued': self.enqueued,
+            'dropped': self.dropped,
+            'written': self.written,
+            'failed': self.failed
+        }
+
+history_writer = WriteBehindQueue(
+    max_size=int(os.getenv('HISTORY_QUEUE_SIZE', '10000')),
+    workers=int(os.getenv('HISTORY_QUEUE_WORKERS', '2')),
+    batch_size=int(os.getenv('HISTORY_QUEUE_BATCH_SIZE', '200')),
+    flush_interval=float(os.getenv('HISTORY_QUEUE_FLUSH_INTERVAL', '1.0'))
+)
+atexit.register(history_writer.drain)
+
+# AI generation runs on a shared executor with a concurrency cap and timeout;
+# request threads still wait for each result (see generation.py)
+generation = GenerationPipeline(
+    create_backend(os.getenv('GENERATION_BACKEND', 'fake')),
+    max_concurrency=int(os.getenv('GENERATION_CONCURRENCY', '8')),
+    timeout=float(os.getenv('GENERATION_TIMEOUT', '30')),
+    coalesce=os.getenv('GENERATION_COALESCE', 'true').lower() == 'true'
+)
+
+# Longer inputs are cut down to their most informative sentences before generation
+GENERATION_INPUT_CHARS = int(os.getenv('GENERATION_INPUT_CHARS', '5000'))
+
+# Cache of explanations keyed by the normalized input text
+explanation_cache = create_explanation_cache(generation.backend.name)
+
+# Stripe customer/subscription -> user lookup, so webhook routing is a keyed read
+class StripeUserIndex:
+    """Maps Stripe customer and subscription IDs to user IDs.
+
+    Mappings are written by storage.save_subscription and read with
+    storage.find_stripe_user, with an in-process cache in front.
+    """
+
+    def __init__(self, max_size=10000, ttl=3600):
+        self._cache = TTLCache(max_size=max_size, ttl=ttl)
+
+    def remember(self, user_id, customer_id=None, subscription_id=None):
+        """Update the in-process cache after the mappings are saved."""
+        if customer_id:
+            self._cache.set(('customer', customer_id), user_id)
+        if subscription_id:
+            self._cache.set(('subscription', subscription_id), user_id)
+
+    def lookup(self, kind, stripe_id):
+        """Return the user ID for a Stripe customer or subscription ID, or None."""
+        if not stripe_id:
+            return None
+        user_id = self._cache.get((kind, stripe_id))
+        if user_id is not None:
+            return user_id
+        
+        user_id = storage.find_stripe_user(kind, stripe_id)
+        if user_id:
+            self._cache.set((kind, stripe_id), user_id)
+        return user_id
+
+stripe_user_index = StripeUserIndex(
+    max_size=int(os.getenv('STRIPE_INDEX_CACHE_SIZE', '10000')),
+    ttl=int(os.getenv('STRIPE_INDEX_CACHE_TTL', '3600'))
+)
+
+def save_subscription(user_id, customer_id, subscription_id, status, current_period_end):
+    """Write a user's Stripe subscription and its lookup mappings together."""
+    storage.save_subscription(user_id, customer_id, subscription_id, {
+        'status': status,
+        'plan': 'premium',
+        'stripe_subscription_id': subscription_id,
+        'currentPeriodEnd': current_period_end,
+        'created_at': NOW,
+        'updated_at': NOW
+    })
+    
+    stripe_user_index.remember(user_id, customer_id, subscription_id)
+    entitlement_cache.invalidate(user_id)
+
+# Health probes: read-only connectivity checks, cached and rate limited
+class HealthProbe:
+    """Runs a connectivity check at most once per interval and caches the result.
+
+    Only one caller runs the check at a time; concurrent callers get the
+    previous result instead of piling onto a slow dependency.
+    """
+
+    def __init__(self, name, check, interval=30):
+        self.name = name
+        self.check = check
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._last = None
+
+    def result(self):
+        last = self._last
+        if last is not None and time.time() - last['checked_at'] < self.interval:
+            return last
+        if not self._lock.acquire(blocking=False):
+            return last or {'status': 'unknown', 'checked_at': None, 'latency_ms': None}
+        try:
+            started = time.monotonic()
+            try:
+                self.check()
+                result = {'status': 'ok'}
+            except Exception as e:
+                logger.error(f"Health check '{self.name}' failed: {str(e)}")
+                result = {'status': 'error', 'error': str(e)}
+            result['latency_ms'] = round((time.monotonic() - started) * 1000, 1)
+            result['checked_at'] = time.time()
+            self._last = result
+            return result
+        finally:
+            self._lock.release()
+
+def check_storage():
+    if not storage.available:
+        raise RuntimeError('Firestore client is not initialized')
+    try:
+        storage.ping()
+    except Exception as e:
+        if "403" in str(e) and "not been used" in str(e):
+            logger.error("SOLUTION: Go to https://console.firebase.google.com/project/eli5-322a1/firestore")
+            logger.error("and click 'Create database' to enable Firestore for this project.")
+        raise
+
+def check_stripe():
+    stripe.Balance.retrieve()
+
+HEALTH_CHECK_INTERVAL = int(os.getenv('HEALTH_CHECK_INTERVAL', '30'))
+health_probes = [
+    HealthProbe(storage.name, check_storage, interval=HEALTH_CHECK_INTERVAL),
+    HealthProbe('stripe', check_stripe, interval=HEALTH_CHECK_INTERVAL)
+]
+storage_probe = health_probes[0]
+started_at = time.time()
+
 # Authentication middleware with improved error handling
 def require_auth(f):
     def decorated_function(*args, **kwargs):
@@ -73,9 +436,9 @@ def require_auth(f):
             return jsonify({'error': 'No authorization header'}), 401
         
         try:
-            # Verify Firebase token
+            # Verify Firebase token (cached until the token expires)
             token = auth_header.split('Bearer ')[1]
-            decoded_token = auth.verify_id_token(token)
+            decoded_token = token_cache.verify(token)
             request.user = decoded_token
             return f(*args, **kwargs)
         except Exception as e:
@@ -96,22 +459,21 @@ def require_premium(f):
             return f(*args, **kwargs)
             
         # Check if Firestore is available
-        if db is None:
+        if not storage.available:
             logger.warning(f"Firestore unavailable - allowing premium access to {user_id} for testing")
             return f(*args, **kwargs)
         
         try:
             # Check if user has premium subscription
-            user_doc = db.collection('users').document(user_id).get()
-            if not user_doc.exists:
+            user_exists, subscription = entitlement_cache.get(user_id)
+            if not user_exists:
                 return jsonify({'error': 'User not found'}), 404
             
-            user_data = user_doc.to_dict()
-            subscription = user_data.get('subscription', {})
-            
             if subscription.get('status') != 'active':
                 return jsonify({'error': 'Premium subscription required', 'code': 'premium_required'}), 403
             
+            # Lets storage writes skip re-reading the user document
+            request.user_exists = True
             return f(*args, **kwargs)
         except Exception as e:
             logger.error(f"Error checking premium status: {str(e)}")
@@ -131,18 +493,12 @@ def has_premium(user_id):
         return True
         
     # Handle case where Firestore is unavailable
-    if db is None:
+    if not storage.available:
         logger.warning("Firestore unavailable - treating user as premium for testing")
         return True
         
     try:
-        user_doc = db.collection('users').document(user_id).get()
-        if not user_doc.exists:
-            return False
-            
-        user_data = user_doc.to_dict()
-        subscription = user_data.get('subscription', {})
-        return subscription.get('status') == 'active'
+        return entitlement_cache.is_active(user_id)
     except Exception as e:
         logger.error(f"Error in has_premium check: {str(e)}")
         # In test mode, default to premium on error
@@ -226,43 +582,206 @@ def create_checkout_session():
         return jsonify({'error': str(e)}), 400
 
 # API Endpoints for Flashcards
+FLASHCARD_FIELDS = ('front', 'back', 'category', 'created_at')
+FLASHCARDS_PAGE_SIZE = int(os.getenv('FLASHCARDS_PAGE_SIZE', '100'))
+FLASHCARDS_MAX_PAGE_SIZE = 500
+
+def encode_cursor(created_at, doc_id):
+    """Encode a page position as an opaque URL-safe token."""
+    raw = json.dumps([created_at, doc_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """Decode a token from encode_cursor, raising ValueError if it is malformed."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, doc_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(doc_id, str) or not doc_id:
+        raise ValueError('Invalid cursor')
+    return created_at, doc_id
+
 @app.route('/api/flashcards', methods=['GET'])
 @require_auth
 @require_premium
 def get_flashcards():
-    """Retrieve user's flashcards from Firestore."""
+    """Retrieve the user's flashcards, newest first.
+
+    Query parameters: limit, cursor (next_cursor from the previous page),
+    category and fields (comma-separated projection). Without limit or
+    cursor the whole deck is returned, as older clients expect. Responses
+    carry an ETag; a matching If-None-Match gets a 304 until the deck changes.
+    """
     try:
         # Get user ID from authenticated request
         user_id = request.user['uid']
         
-        # Access Firestore
-        db = firestore.client()
+        # Parse paging, filtering and projection parameters
+        cursor = request.args.get('cursor')
+        limit = None
+        if 'limit' in request.args or cursor:
+            try:
+                limit = int(request.args.get('limit', FLASHCARDS_PAGE_SIZE))
+            except ValueError:
+                return jsonify({'error': 'limit must be an integer'}), 400
+            limit = max(1, min(limit, FLASHCARDS_MAX_PAGE_SIZE))
         
-        # Get user's flashcards collection
-        flashcards_ref = db.collection('users').document(user_id).collection('flashcards')
-        flashcards = flashcards_ref.stream()
+        category = request.args.get('category')
         
-        # Convert to list of dictionaries
-        flashcards_list = []
-        for card in flashcards:
-            card_data = card.to_dict()
-            card_data['id'] = card.id  # Add document ID
-            flashcards_list.append(card_data)
+        fields = None
+        if request.args.get('fields'):
+            fields = [f.strip() for f in request.args['fields'].split(',') if f.strip()]
+            unknown = [f for f in fields if f not in FLASHCARD_FIELDS]
+            if unknown:
+                return jsonify({'error': f"Unknown fields: {', '.join(unknown)}"}), 400
         
-        return jsonify({
+        # Answer repeat polls of an unchanged deck without reading the cards.
+        # Revalidation re-reads the deck version from the user document, so a
+        # write through another worker is never answered with a 304.
+        version = entitlement_cache.flashcards_version(
+            user_id, refresh=bool(request.if_none_match))
+        etag = make_etag(version, limit, cursor, category, fields)
+        response = not_modified(etag)
+        if response is not None:
+            return response
+        
+        if cursor:
+            try:
+                cursor = decode_cursor(cursor)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+        
+        flashcards_list, next_position = storage.list_flashcards(
+            user_id, limit, cursor=cursor, category=category, fields=fields)
+        next_cursor = encode_cursor(*next_position) if next_position else None
+        
+        return with_etag(jsonify({
             'success': True,
-            'flashcards': flashcards_list
-        })
+            'flashcards': flashcards_list,
+            'next_cursor': next_cursor
+        }), etag)
     
     except Exception as e:
         app.logger.error(f"Get flashcards error: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+# The export stream may take a while for large decks
+EXPORT_TIMEOUT = float(os.getenv('EXPORT_TIMEOUT', '300'))
+
+@app.route('/api/flashcards/export', methods=['GET'])
+@require_auth
+@require_premium
+def export_flashcards():
+    """Stream the user's flashcards as newline-delimited JSON, oldest first.
+
+    Pass ?since=<created_at> to resume from a watermark (inclusive), and
+    ?after=<id> with it to skip cards already received at that timestamp.
+    """
+    user_id = request.user['uid']
+    
+    since = request.args.get('since')
+    after = request.args.get('after')
+    if since is not None:
+        try:
+            since = int(since)
+        except ValueError:
+            return jsonify({'error': 'since must be an integer timestamp'}), 400
+    
+    def generate():
+        # Cards are written out as they arrive from storage, so memory use
+        # stays constant regardless of deck size
+        try:
+            for card_data in storage.iter_flashcards(user_id, since=since, after=after,
+                                                     timeout=EXPORT_TIMEOUT):
+                yield json.dumps(card_data, default=str) + '\n'
+        except Exception as e:
+            app.logger.error(f"Export flashcards error: {str(e)}")
+            yield json.dumps({'error': str(e)}) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+# Near-duplicate detection against each user's stored flashcards
+class FlashcardDedup:
+    """Finds stored cards nearly identical to new ones.
+
+    Cards are stored with the keys from card_bands(). A check first queries
+    storage for cards with the same exact_key, then, for cards still
+    unmatched, for cards sharing an LSH band (at most max_candidates, so
+    decks of very similar cards can't crowd out an exact copy). Candidates
+    are confirmed with card_similarity(). Hold lock(user_id) from the check
+    until the new cards are stored; inserts through other processes aren't
+    serialized with it.
+    """
+
+    def __init__(self, threshold=0.8, max_candidates=100, lock_stripes=64):
+        self.threshold = threshold
+        self.max_candidates = max_candidates
+        self._locks = [threading.Lock() for _ in range(lock_stripes)]
+        self.checks = 0
+        self.candidates = 0
+        self.duplicates = 0
+        self.errors = 0
+
+    def lock(self, user_id):
+        return self._locks[hash(user_id) % len(self._locks)]
+
+    def _match(self, card, candidates):
+        best, best_score = None, self.threshold
+        for candidate in candidates:
+            score = card_similarity(card, candidate)
+            if score >= best_score:
+                best, best_score = candidate['id'], score
+        return best
+
+    def find_duplicates(self, user_id, cards, bands):
+        """Return, for each card, the ID of a near-identical stored card or None.
+
+        bands holds each card's card_bands() keys.
+        """
+        self.checks += len(cards)
+        duplicates = [None] * len(cards)
+        try:
+            # Exact copies first, then LSH candidates for the rest
+            stages = (lambda band_keys: band_keys[:1], lambda band_keys: band_keys[1:])
+            for stage in stages:
+                pending = [i for i, duplicate in enumerate(duplicates) if duplicate is None]
+                if not pending:
+                    break
+                wanted = sorted({band for i in pending for band in stage(bands[i])})
+                candidates = storage.find_flashcards_by_bands(user_id, wanted, self.max_candidates)
+                self.candidates += len(candidates)
+                for i in pending:
+                    duplicates[i] = self._match(cards[i], candidates)
+        except Exception as e:
+            # Never block inserts on the duplicate check
+            self.errors += 1
+            logger.error(f"Error looking up similar flashcards for {user_id}: {str(e)}")
+        self.duplicates += sum(duplicate is not None for duplicate in duplicates)
+        return duplicates
+
+    def stats(self):
+        return {
+            'checks': self.checks,
+            'candidates': self.candidates,
+            'duplicates': self.duplicates,
+            'errors': self.errors
+        }
+
+flashcard_dedup = FlashcardDedup(
+    threshold=float(os.getenv('FLASHCARD_DEDUP_THRESHOLD', '0.8')),
+    max_candidates=int(os.getenv('FLASHCARD_DEDUP_CANDIDATES', '100'))
+)
+
 @app.route('/api/flashcards', methods=['POST'])
 @require_auth
 @require_premium
 def create_flashcard():
-    """Create a new flashcard."""
+    """Create a new flashcard.
+
+    Returns 409 with the existing card's ID if the deck already has a
+    near-identical card (front and back), unless allow_duplicate is true.
+    """
     try:
         data = request.get_json()
         
@@ -281,12 +800,24 @@ def create_flashcard():
         # Get user ID from authenticated request
         user_id = request.user['uid']
         
-        # Save to Firestore
-        db = firestore.client()
-        flashcard_ref = db.collection('users').document(user_id).collection('flashcards').add(flashcard)
+        bands = card_bands(flashcard)
+        with flashcard_dedup.lock(user_id):
+            if not data.get('allow_duplicate'):
+                duplicate_id = flashcard_dedup.find_duplicates(user_id, [flashcard], [bands])[0]
+                if duplicate_id is not None:
+                    return jsonify({
+                        'error': 'A similar flashcard already exists',
+                        'code': 'duplicate',
+                        'duplicate_of': duplicate_id
+                    }), 409
+            
+            # Save to storage
+            flashcard_id = storage.add_flashcard(user_id, flashcard, dedup_bands=bands,
+                                                 user_exists=getattr(request, 'user_exists', None))
+        entitlement_cache.invalidate(user_id)
         
         # Return the created flashcard with ID
-        flashcard['id'] = flashcard_ref[1].id
+        flashcard['id'] = flashcard_id
         
         return jsonify({
             'success': True,
@@ -301,7 +832,12 @@ def create_flashcard():
 @require_auth
 @require_premium
 def generate_flashcards():
-    """Generate flashcards based on provided text using AI."""
+    """Generate flashcards based on provided text using AI.
+
+    Cards nearly identical to one already in the deck (or earlier in the
+    same batch) are skipped and counted in skipped_duplicates, unless
+    allow_duplicate is true.
+    """
     try:
         data = request.get_json()
         text = data.get('text', '')
@@ -309,71 +845,76 @@ def generate_flashcards():
         if not text or len(text) < 20:
             return jsonify({'error': 'Text too short. Please provide more content.'}), 400
         
-        # Limit text length for the API call
-        if len(text) > 5000:
-            text = text[:5000]
+        # Keep the most informative sentences of long inputs for the API call
+        text = summarize(text, GENERATION_INPUT_CHARS)
             
         # Get user ID from authenticated request
         user_id = request.user['uid']
         
         try:
-            # Generate flashcards using OpenAI
-            # In a production environment, you'd use the OpenAI API or similar service
-            # For demo purposes, we'll create some sample flashcards
-            
-            # Simulate AI generation delay
-            time.sleep(1.5)
-            
-            # Sample flashcards based on content (in production, use actual AI generation)
-            sample_flashcards = [
-                {
-                    "front": "What is the main purpose of ELI5?",
-                    "back": "To explain complex concepts in simple terms that a 5-year-old could understand.",
-                    "category": "General",
-                    "created_at": int(time.time())
-                },
-                {
-                    "front": "What does ELI5 stand for?",
-                    "back": "Explain Like I'm 5",
-                    "category": "Terminology",
-                    "created_at": int(time.time())
-                },
-                {
-                    "front": "What is the benefit of using flashcards?",
-                    "back": "Flashcards use active recall and spaced repetition to enhance learning and memory retention.",
-                    "category": "Learning",
-                    "created_at": int(time.time())
-                }
-            ]
+            # Generate flashcards with the configured backend
+            created_at = int(time.time())
+            generated_flashcards = []
+            for card in generation.generate_flashcards(text):
+                card = dict(card)
+                card.setdefault('category', 'General')
+                card['created_at'] = created_at
+                generated_flashcards.append(card)
             
-            # Save flashcards to Firestore
-            db = firestore.client()
+            if not generated_flashcards:
+                return jsonify({'error': 'Could not find anything to make flashcards from. Please provide more content.'}), 422
             
-            # Get user document reference
-            user_ref = db.collection('users').document(user_id)
-            
-            # Add flashcards to user's collection
-            flashcards_ref = user_ref.collection('flashcards')
-            
-            for card in sample_flashcards:
-                flashcards_ref.add(card)
+            bands = [card_bands(card) for card in generated_flashcards]
+            allow_duplicate = bool(data.get('allow_duplicate'))
+            with flashcard_dedup.lock(user_id):
+                if allow_duplicate:
+                    duplicates = [None] * len(generated_flashcards)
+                else:
+                    duplicates = flashcard_dedup.find_duplicates(user_id, generated_flashcards, bands)
                 
-            # Update user statistics
-            user_doc = user_ref.get()
-            if user_doc.exists:
-                user_data = user_doc.to_dict()
-                current_count = user_data.get('flashcards_generated', 0)
-                user_ref.update({
-                    'flashcards_generated': current_count + len(sample_flashcards),
-                    'last_generation': firestore.SERVER_TIMESTAMP
-                })
+                # Drop near-duplicates of the deck and of earlier cards in this batch
+                batch_index = NearDuplicateIndex(threshold=flashcard_dedup.threshold)
+                new_flashcards = []
+                new_bands = []
+                for card, band_keys, duplicate_id in zip(generated_flashcards, bands, duplicates):
+                    if duplicate_id is not None:
+                        continue
+                    if not allow_duplicate and batch_index.find(card, band_keys) is not None:
+                        continue
+                    batch_index.add(len(new_flashcards), card, band_keys)
+                    new_flashcards.append(card)
+                    new_bands.append(band_keys)
+                skipped = len(generated_flashcards) - len(new_flashcards)
+                
+                if not new_flashcards:
+                    return jsonify({
+                        'success': True,
+                        'flashcards': [],
+                        'skipped_duplicates': skipped,
+                        'message': 'All generated flashcards are already in your deck'
+                    })
+                
+                # Save flashcards and update user statistics together
+                card_ids = storage.add_generated_flashcards(
+                    user_id, [dict(card) for card in new_flashcards], dedup_bands=new_bands,
+                    user_exists=getattr(request, 'user_exists', None))
+                for card, card_id in zip(new_flashcards, card_ids):
+                    card['id'] = card_id
+            entitlement_cache.invalidate(user_id)
             
             return jsonify({
                 'success': True,
-                'flashcards': sample_flashcards,
-                'message': f'Generated {len(sample_flashcards)} flashcards successfully'
+                'flashcards': new_flashcards,
+                'skipped_duplicates': skipped,
+                'message': f'Generated {len(new_flashcards)} flashcards successfully'
             })
             
+        except GenerationOverloaded as e:
+            app.logger.warning(f"Flashcard generation rejected: {str(e)}")
+            return jsonify({'error': 'Flashcard generation is busy, please try again'}), 503
+        except GenerationTimeout as e:
+            app.logger.error(f"Flashcard generation timed out: {str(e)}")
+            return jsonify({'error': 'Flashcard generation took too long, please try again'}), 504
         except Exception as e:
             app.logger.error(f"Error generating flashcards: {str(e)}")
             return jsonify({'error': f'Failed to generate flashcards: {str(e)}'}), 500
@@ -385,7 +926,11 @@ def generate_flashcards():
 @app.route('/api/user/subscription', methods=['GET'])
 @require_auth
 def get_subscription_status():
-    """Get user's subscription status."""
+    """Get user's subscription status.
+
+    Responses from stored data carry an ETag; a matching If-None-Match gets a
+    304 while the cached entitlement is unchanged.
+    """
     try:
         # Get user ID from authenticated request
         user_id = request.user['uid']
@@ -416,7 +961,7 @@ def get_subscription_status():
             })
         
         # Check if Firestore is available
-        if db is None:
+        if not storage.available:
             logger.warning(f"Firestore unavailable during subscription check for {user_id}")
             
             # In test mode, return premium status
@@ -445,24 +990,18 @@ def get_subscription_status():
                 }), 503
         
         try:
-            # Access Firestore
-            # Get user document
-            user_ref = db.collection('users').document(user_id)
-            user_doc = user_ref.get()
+            # Read the user's entitlement (cached, falls back to storage)
+            user_exists, subscription, version = entitlement_cache.get_versioned(user_id)
             
-            if not user_doc.exists:
+            if not user_exists:
                 status_source = "no_user_doc"
                 return jsonify({
                     'isPremium': False, 
                     'status_source': status_source,
                     'is_test_mode': is_test_mode
                 }), 404
-                
-            user_data = user_doc.to_dict()
-            logger.info(f"User data for {user_id}: {user_data.keys()}")
             
             # Check if user has active subscription
-            subscription = user_data.get('subscription', {})
             is_premium = subscription.get('status') == 'active'
             
             logger.info(f"User {user_id} premium status: {is_premium}, subscription status: {subscription.get('status', 'none')}")
@@ -475,13 +1014,18 @@ def get_subscription_status():
             else:
                 status_source = "firestore_data"
             
-            return jsonify({
+            etag = make_etag(version, status_source)
+            response = not_modified(etag)
+            if response is not None:
+                return response
+            
+            return with_etag(jsonify({
                 'isPremium': is_premium,
                 'subscription': subscription,
                 'status_source': status_source,
                 'is_test_mode': is_test_mode,
                 'user_exists': True
-            })
+            }), etag)
         except Exception as firestore_error:
             logger.error(f"Firestore error during subscription check: {str(firestore_error)}")
             
@@ -526,15 +1070,13 @@ def create_portal_session():
         user_id = request.user['uid']
         print(f"Creating portal session for user: {user_id}")
         
-        # Get user's subscription from Firestore
-        db = firestore.client()
-        user_doc = db.collection('users').document(user_id).get()
+        # Get user's subscription from storage
+        user_data = storage.get_user(user_id)
         
-        if not user_doc.exists:
+        if user_data is None:
             print(f"Error: User document not found for {user_id}")
             return jsonify({'error': 'User not found'}), 404
         
-        user_data = user_doc.to_dict()
         print(f"User data: {user_data.keys()}")
         
         # Check for Stripe customer ID
@@ -588,19 +1130,9 @@ def success():
                         print(f"Manually updating subscription for user {user_id}")
                         print(f"Status: {status}, Customer: {customer_id}, Sub: {subscription_id}")
                         
-                        # Update user document
-                        db = firestore.client()
-                        db.collection('users').document(user_id).update({
-                            'stripe_customer_id': customer_id,
-                            'subscription': {
-                                'status': status,
-                                'plan': 'premium',
-                                'stripe_subscription_id': subscription_id,
-                                'currentPeriodEnd': current_period_end,
-                                'created_at': firestore.SERVER_TIMESTAMP,
-                                'updated_at': firestore.SERVER_TIMESTAMP
-                            }
-                        })
+                        # Update user document and lookup mappings
+                        save_subscription(user_id, customer_id, subscription_id,
+                                          status, current_period_end)
                         
                         print(f"Successfully updated subscription status for user: {user_id}")
                 except Exception as e:
@@ -640,6 +1172,118 @@ def extension_popup():
     """Serve the extension popup HTML."""
     return render_template('extension_popup.html')
 
+def handle_stripe_event(event):
+    """Apply a verified Stripe event to storage.
+
+    Raises on failures worth retrying; events that can never succeed are
+    logged and ignored.
+    """
+    print(f"Processing webhook event {event.get('id')} of type: {event['type']}")
+    
+    if event['type'] == 'checkout.session.completed':
+        session = event['data']['object']
+        
+        print(f"Checkout completed. Session ID: {session.get('id')}")
+        print(f"Customer ID: {session.get('customer')}")
+        print(f"Subscription ID: {session.get('subscription')}")
+        
+        # Get user_id from metadata
+        user_id = session.get('metadata', {}).get('user_id')
+        
+        if not user_id:
+            print("Error: No user_id in session metadata")
+            return
+            
+        print(f"Updating subscription for user: {user_id}")
+        
+        # Fetch subscription details
+        subscription = stripe.Subscription.retrieve(session.get('subscription'))
+        current_period_end = subscription.current_period_end
+        status = subscription.status
+        
+        print(f"Subscription status: {status}")
+        print(f"Current period end: {current_period_end}")
+        
+        # Update user's subscription status and lookup mappings in Firestore
+        save_subscription(user_id, session.get('customer'), session.get('subscription'),
+                          status, current_period_end)
+        
+        print(f"Successfully updated subscription for user: {user_id}")
+            
+    elif event['type'] == 'customer.subscription.updated':
+        subscription = event['data']['object']
+        
+        # Find the user from the customer ID on the subscription
+        customer_id = subscription.get('customer')
+        user_id = stripe_user_index.lookup('customer', customer_id)
+        
+        if not user_id:
+            # The checkout event may not have been processed yet, so retry
+            raise LookupError(f"No user found for customer: {customer_id}")
+        
+        print(f"Subscription updated for user: {user_id}")
+        print(f"New status: {subscription.get('status')}")
+        
+        # Update subscription status in storage
+        storage.update_user(user_id, {
+            'subscription': {
+                'status': subscription.get('status'),
+                'currentPeriodEnd': subscription.get('current_period_end'),
+                'updated_at': NOW
+            }
+        })
+        
+        entitlement_cache.invalidate(user_id)
+        print(f"Successfully updated subscription status for user: {user_id}")
+    
+    elif event['type'] == 'customer.subscription.deleted':
+        subscription = event['data']['object']
+        
+        # Find user with this subscription ID
+        user_id = stripe_user_index.lookup('subscription', subscription.id)
+        
+        if not user_id:
+            raise LookupError(f"No user found for subscription: {subscription.id}")
+        
+        print(f"Subscription cancelled for user: {user_id}")
+        
+        # Update subscription status in storage
+        storage.update_user(user_id, {
+            'subscription': {
+                'status': 'cancelled',
+                'cancelled_at': NOW,
+                'updated_at': NOW
+            }
+        })
+        
+        entitlement_cache.invalidate(user_id)
+        print(f"Successfully updated subscription status to cancelled for user: {user_id}")
+
+def process_queued_webhook(event_id, payload):
+    """WebhookQueue handler: rebuild the Stripe event and apply it."""
+    event = stripe.Event.construct_from(json.loads(payload), stripe.api_key)
+    handle_stripe_event(event)
+
+# Verified webhook events are queued durably and processed in the background,
+# so Stripe gets an immediate ACK and redeliveries of an event are no-ops
+WEBHOOK_ASYNC = os.getenv('WEBHOOK_ASYNC', 'true').lower() == 'true'
+webhook_queue = None
+if WEBHOOK_ASYNC:
+    webhook_queue = WebhookQueue(
+        os.getenv('WEBHOOK_QUEUE_PATH', 'webhook_queue.sqlite3'),
+        process_queued_webhook,
+        workers=int(os.getenv('WEBHOOK_WORKERS', '2')),
+        max_attempts=int(os.getenv('WEBHOOK_MAX_ATTEMPTS', '10')),
+        retry_delay=float(os.getenv('WEBHOOK_RETRY_DELAY', '30')),
+        max_retry_delay=float(os.getenv('WEBHOOK_MAX_RETRY_DELAY', '3600'))
+    )
+
+@app.before_first_request
+def start_webhook_workers():
+    # Drain events left over from a previous run without waiting for a new webhook
+    if webhook_queue is not None:
+        webhook_queue.start()
+
 # Webhook handler for Stripe events
 @app.route('/webhook', methods=['POST'])
 def webhook():
@@ -652,7 +1296,7 @@ def webhook():
     try:
         # If testing and no webhook secret is set, skip signature verification
         if is_test_mode and not webhook_secret:
-            event = json.loads(payload)
+            event = stripe.Event.construct_from(json.loads(payload), stripe.api_key)
             print("TEST MODE: Skipping signature verification")
         else:
             event = stripe.Webhook.construct_event(
@@ -670,118 +1314,136 @@ def webhook():
         print(f"Webhook error: {str(e)}")
         return jsonify({'error': str(e)}), 400
 
-    # Handle the event
-    if event['type'] == 'checkout.session.completed':
-        session = event['data']['object']
-        
-        print(f"Checkout completed. Session ID: {session.get('id')}")
-        print(f"Customer ID: {session.get('customer')}")
-        print(f"Subscription ID: {session.get('subscription')}")
-        
-        # Get user_id from metadata
-        user_id = session.get('metadata', {}).get('user_id')
-        
-        if not user_id:
-            print("Error: No user_id in session metadata")
-            return jsonify({'error': 'No user_id in metadata'}), 400
-            
-        print(f"Updating subscription for user: {user_id}")
-        
-        # Fetch subscription details
+    if webhook_queue is not None:
         try:
-            subscription = stripe.Subscription.retrieve(session.get('subscription'))
-            current_period_end = subscription.current_period_end
-            status = subscription.status
-            
-            print(f"Subscription status: {status}")
-            print(f"Current period end: {current_period_end}")
-            
-            # Update user's subscription status in Firestore
-            db.collection('users').document(user_id).update({
-                'stripe_customer_id': session.get('customer'),
-                'subscription': {
-                    'status': status,
-                    'plan': 'premium',
-                    'stripe_subscription_id': session.get('subscription'),
-                    'currentPeriodEnd': current_period_end,
-                    'created_at': firestore.SERVER_TIMESTAMP,
-                    'updated_at': firestore.SERVER_TIMESTAMP
-                }
-            })
-            
-            print(f"Successfully updated subscription for user: {user_id}")
+            queued = webhook_queue.enqueue(event['id'], event['type'], payload.decode('utf-8'))
         except Exception as e:
-            print(f"Error updating user subscription: {str(e)}")
+            print(f"Error queueing webhook event: {str(e)}")
             return jsonify({'error': str(e)}), 500
-            
-    elif event['type'] == 'customer.subscription.updated':
-        subscription = event['data']['object']
         
-        # In actual webhook from Stripe, metadata is on the customer, not subscription
-        # We need to retrieve the customer to get the metadata
-        try:
-            customer = stripe.Customer.retrieve(subscription.get('customer'))
-            # Try to find user from our database based on customer ID
-            user_docs = db.collection('users').where('stripe_customer_id', '==', customer.id).limit(1).get()
-            
-            if not user_docs:
-                print(f"No user found for customer: {customer.id}")
-                return jsonify({'error': 'User not found'}), 404
-                
-            user_id = user_docs[0].id
-            
-            print(f"Subscription updated for user: {user_id}")
-            print(f"New status: {subscription.get('status')}")
-            
-            # Update subscription status in Firestore
-            db.collection('users').document(user_id).update({
-                'subscription': {
-                    'status': subscription.get('status'),
-                    'currentPeriodEnd': subscription.get('current_period_end'),
-                    'updated_at': firestore.SERVER_TIMESTAMP
-                }
-            })
-            
-            print(f"Successfully updated subscription status for user: {user_id}")
-        except Exception as e:
-            print(f"Error updating subscription status: {str(e)}")
-            return jsonify({'error': str(e)}), 500
+        if not queued:
+            print(f"Duplicate webhook event ignored: {event['id']}")
+            return jsonify({'status': 'duplicate'})
+        return jsonify({'status': 'queued'})
     
-    elif event['type'] == 'customer.subscription.deleted':
-        subscription = event['data']['object']
-        
-        try:
-            # Find user with this subscription ID
-            user_docs = db.collection('users').where('subscription.stripe_subscription_id', '==', subscription.id).limit(1).get()
-            
-            if not user_docs:
-                print(f"No user found for subscription: {subscription.id}")
-                return jsonify({'error': 'User not found'}), 404
-                
-            user_id = user_docs[0].id
-            
-            print(f"Subscription cancelled for user: {user_id}")
-            
-            # Update subscription status in Firestore
-            db.collection('users').document(user_id).update({
-                'subscription': {
-                    'status': 'cancelled',
-                    'cancelled_at': firestore.SERVER_TIMESTAMP,
-                    'updated_at': firestore.SERVER_TIMESTAMP
-                }
-            })
-            
-            print(f"Successfully updated subscription status to cancelled for user: {user_id}")
-        except Exception as e:
-            print(f"Error handling subscription cancellation: {str(e)}")
-            return jsonify({'error': str(e)}), 500
+    # Synchronous processing (WEBHOOK_ASYNC=false)
+    try:
+        handle_stripe_event(event)
+    except Exception as e:
+        print(f"Error handling webhook event: {str(e)}")
+        return jsonify({'error': str(e)}), 500
 
     # Return a success response
     return jsonify({'status': 'success'})
 
+def get_optional_user_id():
+    """Return the caller's user ID if a valid token was sent, otherwise None."""
+    if 'Authorization' not in request.headers:
+        return None
+    token = request.headers['Authorization'].replace('Bearer ', '')
+    try:
+        decoded_token = token_cache.verify(token)
+        return decoded_token['uid']
+    except Exception as e:
+        app.logger.warning(f"Invalid token in {request.path}: {str(e)}")
+        # Continue without user_id - explanation works for non-authenticated users too
+        return None
+
+def history_entry(text, explanation, source='extension'):
+    return {
+        'original_text': text[:500] + ('...' if len(text) > 500 else ''),
+        'explanation': explanation,
+        'timestamp': NOW,
+        'source': source
+    }
+
+def save_explanation_history(user_id, text, explanation, source='extension'):
+    """Queue a history entry and stats update; they are written in the background."""
+    try:
+        history_writer.put(user_id, history_entry(text, explanation, source))
+    except Exception as e:
+        app.logger.error(f"Error queueing explanation history: {str(e)}")
+        # Continue without saving history - don't fail the request
+
+def explain_passage(text):
+    """Return (explanation, cached) for text, using the cache when possible.
+
+    Raises GenerationOverloaded or GenerationTimeout from the pipeline.
+    """
+    explanation = None
+    if explanation_cache is not None:
+        explanation = explanation_cache.get(text)
+    if explanation is not None:
+        return explanation, True
+    
+    explanation = generation.explain(text)
+    if explanation_cache is not None:
+        explanation_cache.set(text, explanation)
+    return explanation, False
+
+def sse_event(data, event=None):
+    """Format a server-sent event with a JSON payload."""
+    message = f"event: {event}\n" if event else ''
+    return message + f"data: {json.dumps(data)}\n\n"
+
+def stream_explanation_response(text, user_id):
+    """Stream an explanation as server-sent events.
+
+    Emits one event per chunk ({"token": ...}), then a "done" event with the
+    full explanation. History and the cache are written once the stream ends.
+    """
+    explanation = explanation_cache.get(text) if explanation_cache is not None else None
+    cached = explanation is not None
+    if cached:
+        chunks = iter([explanation])
+    else:
+        chunks = generation.stream_explanation(text)
+    
+    # Pull the first chunk now so overload and timeout errors still get a status code
+    try:
+        first_chunk = next(chunks, None)
+    except GenerationOverloaded as e:
+        app.logger.warning(f"Explanation rejected: {str(e)}")
+        return jsonify({'error': 'Explanation service is busy, please try again'}), 503
+    except GenerationTimeout as e:
+        app.logger.error(f"Explanation timed out: {str(e)}")
+        return jsonify({'error': 'Explanation took too long, please try again'}), 504
+    
+    def generate():
+        parts = []
+        try:
+            if first_chunk is not None:
+                parts.append(first_chunk)
+                yield sse_event({'token': first_chunk})
+            for chunk in chunks:
+                parts.append(chunk)
+                yield sse_event({'token': chunk})
+        except Exception as e:
+            app.logger.error(f"Streaming explanation error: {str(e)}")
+            yield sse_event({'error': str(e)}, event='error')
+            return
+        
+        full_explanation = ''.join(parts)
+        if not cached and explanation_cache is not None:
+            explanation_cache.set(text, full_explanation)
+        if user_id:
+            save_explanation_history(user_id, text, full_explanation)
+        yield sse_event({
+            'explanation': full_explanation,
+            'original_text_length': len(text),
+            'cached': cached
+        }, event='done')
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/explain', methods=['POST'])
 def explain_text():
-    """Generate a simple explanation for the provided text."""
+    """Generate a simple explanation for the provided text.
+
+    Pass ?stream=true (or Accept: text/event-stream) to receive the
+    explanation as server-sent events while it is generated.
+    """
     try:
         data = request.get_json()
         text = data.get('text', '')
@@ -789,72 +1451,178 @@ def explain_text():
         if not text or len(text) < 10:
             return jsonify({'error': 'Text too short. Please provide more content.'}), 400
         
-        # Limit text length for the API call
-        if len(text) > 5000:
-            text = text[:5000]
+        # Keep the most informative sentences of long inputs for the API call
+        text = summarize(text, GENERATION_INPUT_CHARS)
         
         # Get user ID if authenticated
-        user_id = None
-        if 'Authorization' in request.headers:
-            token = request.headers['Authorization'].replace('Bearer ', '')
-            try:
-                decoded_token = auth.verify_id_token(token)
-                user_id = decoded_token['uid']
-            except Exception as e:
-                app.logger.warning(f"Invalid token in /explain: {str(e)}")
-                # Continue without user_id - explanation works for non-authenticated users too
-        
-        # In a production environment, you'd use OpenAI or another AI service
-        # For demo purposes, we'll create a simple explanation
+        user_id = get_optional_user_id()
         
-        # Simulate AI delay
-        time.sleep(1)
+        if (request.args.get('stream', 'false').lower() == 'true'
+                or request.accept_mimetypes.best == 'text/event-stream'):
+            return stream_explanation_response(text, user_id)
         
-        # Create a simple explanation
-        if len(text) < 100:
-            explanation = f"Simply put: {text}"
-        else:
-            first_sentence = text.split('. ')[0] + '.'
-            explanation = f"In simple terms, this is about {first_sentence} The key idea is to understand this concept as if explaining to a 5-year-old."
+        # Serve repeated passages from the explanation cache, otherwise
+        # generate the explanation with the configured backend
+        try:
+            explanation, cached = explain_passage(text)
+        except GenerationOverloaded as e:
+            app.logger.warning(f"Explanation rejected: {str(e)}")
+            return jsonify({'error': 'Explanation service is busy, please try again'}), 503
+        except GenerationTimeout as e:
+            app.logger.error(f"Explanation timed out: {str(e)}")
+            return jsonify({'error': 'Explanation took too long, please try again'}), 504
         
         # If user is authenticated, save to history
         if user_id:
-            try:
-                db = firestore.client()
-                history_ref = db.collection('users').document(user_id).collection('explanation_history')
-                
-                history_item = {
-                    'original_text': text[:500] + ('...' if len(text) > 500 else ''),
-                    'explanation': explanation,
-                    'timestamp': firestore.SERVER_TIMESTAMP,
-                    'source': 'extension'
-                }
-                
-                history_ref.add(history_item)
-                
-                # Update user statistics
-                user_ref = db.collection('users').document(user_id)
-                user_doc = user_ref.get()
-                if user_doc.exists:
-                    user_data = user_doc.to_dict()
-                    current_count = user_data.get('explanations_generated', 0)
-                    user_ref.update({
-                        'explanations_generated': current_count + 1,
-                        'last_explanation': firestore.SERVER_TIMESTAMP
-                    })
-            except Exception as e:
-                app.logger.error(f"Error saving explanation history: {str(e)}")
-                # Continue without saving history - don't fail the request
+            save_explanation_history(user_id, text, explanation)
         
         return jsonify({
             'explanation': explanation,
-            'original_text_length': len(text)
+            'original_text_length': len(text),
+            'cached': cached
         })
     
     except Exception as e:
         app.logger.error(f"Explanation error: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+BATCH_EXPLAIN_MAX_ITEMS = int(os.getenv('BATCH_EXPLAIN_MAX_ITEMS', '50'))
+BATCH_EXPLAIN_CONCURRENCY = int(os.getenv('BATCH_EXPLAIN_CONCURRENCY', '8'))
+
+@app.route('/api/explain/batch', methods=['POST'])
+def explain_batch():
+    """Explain several passages in one request.
+
+    Body: {"passages": ["...", ...]}. Passages are explained concurrently and
+    the response lists one result per passage, in order, each with either an
+    explanation or an error. History for all passages is saved in one batch.
+    """
+    try:
+        data = request.get_json()
+        passages = data.get('passages')
+        
+        if not isinstance(passages, list) or not passages:
+            return jsonify({'error': 'passages must be a non-empty list'}), 400
+        if len(passages) > BATCH_EXPLAIN_MAX_ITEMS:
+            return jsonify({'error': f'Too many passages (max {BATCH_EXPLAIN_MAX_ITEMS})'}), 400
+        
+        user_id = get_optional_user_id()
+        
+        def explain_item(index, text):
+            if not isinstance(text, str) or len(text) < 10:
+                return {'index': index, 'error': 'Text too short. Please provide more content.'}
+            text = summarize(text, GENERATION_INPUT_CHARS)
+            try:
+                explanation, cached = explain_passage(text)
+            except GenerationOverloaded:
+                return {'index': index, 'error': 'Explanation service is busy, please try again'}
+            except GenerationTimeout:
+                return {'index': index, 'error': 'Explanation took too long, please try again'}
+            except Exception as e:
+                app.logger.error(f"Batch explanation error: {str(e)}")
+                return {'index': index, 'error': str(e)}
+            return {
+                'index': index,
+                'explanation': explanation,
+                'original_text_length': len(text),
+                'cached': cached,
+                '_text': text
+            }
+        
+        workers = min(BATCH_EXPLAIN_CONCURRENCY, len(passages))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(explain_item, range(len(passages)), passages))
+        
+        # Save history for every successful item in one batched write
+        history_items = [history_entry(r.pop('_text'), r['explanation'])
+                         for r in results if 'explanation' in r]
+        if user_id and history_items:
+            try:
+                history_writer.put_many(user_id, history_items)
+            except Exception as e:
+                app.logger.error(f"Error queueing explanation history: {str(e)}")
+        
+        return jsonify({
+            'results': results,
+            'succeeded': len(history_items),
+            'failed': len(results) - len(history_items)
+        })
+    
+    except Exception as e:
+        app.logger.error(f"Batch explanation request error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+# Extract more than the generation budget so summarization has text to choose from
+EXTRACT_MAX_CHARS = 4 * GENERATION_INPUT_CHARS
+EXTRACT_MAX_HTML_BYTES = int(os.getenv('EXTRACT_MAX_HTML_BYTES', str(5 * 1024 * 1024)))
+
+class PageTooLarge(Exception):
+    pass
+
+def iter_request_html(chunk_size=65536):
+    """Yield the raw text/html request body in chunks, up to EXTRACT_MAX_HTML_BYTES."""
+    received = 0
+    while True:
+        chunk = request.stream.read(chunk_size)
+        if not chunk:
+            return
+        received += len(chunk)
+        if received > EXTRACT_MAX_HTML_BYTES:
+            raise PageTooLarge()
+        yield chunk
+
+@app.route('/api/extract-and-explain', methods=['POST'])
+def extract_and_explain():
+    """Extract the main text from a web page and explain it.
+
+    Send the page either as {"html": "..."} or as a raw text/html body, which
+    is parsed as it is read. Navigation, ads and other boilerplate are
+    dropped and the remaining text is summarized to the /api/explain budget.
+    """
+    try:
+        if request.mimetype == 'text/html':
+            html = iter_request_html()
+        else:
+            data = request.get_json() or {}
+            html = data.get('html')
+            if not html:
+                if data.get('imageData'):
+                    return jsonify({'error': 'Image extraction is not supported by this server; send the page HTML instead'}), 400
+                return jsonify({'error': 'No HTML provided'}), 400
+            if len(html) > EXTRACT_MAX_HTML_BYTES:
+                raise PageTooLarge()
+
+        text = summarize(extract_main_text(html, max_chars=EXTRACT_MAX_CHARS), GENERATION_INPUT_CHARS)
+        if len(text) < 10:
+            return jsonify({'error': 'Could not find enough text on the page'}), 422
+
+        user_id = get_optional_user_id()
+
+        try:
+            explanation, cached = explain_passage(text)
+        except GenerationOverloaded as e:
+            app.logger.warning(f"Explanation rejected: {str(e)}")
+            return jsonify({'error': 'Explanation service is busy, please try again'}), 503
+        except GenerationTimeout as e:
+            app.logger.error(f"Explanation timed out: {str(e)}")
+            return jsonify({'error': 'Explanation took too long, please try again'}), 504
+
+        if user_id:
+            save_explanation_history(user_id, text, explanation, source='page')
+
+        return jsonify({
+            'extractedText': text,
+            'explanation': explanation,
+            'original_text_length': len(text),
+            'cached': cached
+        })
+
+    except PageTooLarge:
+        return jsonify({'error': f'Page too large (max {EXTRACT_MAX_HTML_BYTES} bytes)'}), 413
+    except Exception as e:
+        app.logger.error(f"Extract and explain error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/verify-token', methods=['GET'])
 @require_auth
 def verify_token():
@@ -874,14 +1642,12 @@ def fix_subscription():
         user_id = request.user['uid']
         print(f"Attempting to fix subscription for user: {user_id}")
         
-        # Get user from Firestore
-        db_client = firestore.client()
-        user_doc = db_client.collection('users').document(user_id).get()
+        # Get user from storage
+        user_data = storage.get_user(user_id)
         
-        if not user_doc.exists:
+        if user_data is None:
             return jsonify({'success': False, 'error': 'User not found in Firestore'}), 404
             
-        user_data = user_doc.to_dict()
         print(f"User data: {user_data.keys()}")
         
         # Check for Stripe customer ID
@@ -937,18 +1703,9 @@ def fix_subscription():
             status = subscription.status
             current_period_end = subscription.current_period_end
             
-            # Update user in Firestore
-            db_client.collection('users').document(user_id).update({
-                'stripe_customer_id': stripe_customer_id,
-                'subscription': {
-                    'status': status,
-                    'plan': 'premium',
-                    'stripe_subscription_id': subscription_id,
-                    'currentPeriodEnd': current_period_end,
-                    'created_at': firestore.SERVER_TIMESTAMP,
-                    'updated_at': firestore.SERVER_TIMESTAMP
-                }
-            })
+            # Update user and lookup mappings in Firestore
+            save_subscription(user_id, stripe_customer_id, subscription_id,
+                              status, current_period_end)
             
             print(f"Successfully fixed subscription for user {user_id}")
             
@@ -1050,32 +1807,59 @@ def quickfix():
     </html>
     """
 
+@app.route('/api/health', methods=['GET'])
+def health():
+    """Liveness probe: the process is up. Never touches the network."""
+    return jsonify({'status': 'ok', 'uptime_seconds': round(time.time() - started_at, 1)})
+
+@app.route('/api/health/ready', methods=['GET'])
+def health_ready():
+    """Readiness probe: cached storage and Stripe checks plus in-process stats."""
+    checks = {probe.name: probe.result() for probe in health_probes}
+    ready = all(check['status'] == 'ok' for check in checks.values())
+    
+    stats = {
+        'token_cache': token_cache.stats(),
+        'entitlement_cache': entitlement_cache.stats(),
+        'flashcard_dedup': flashcard_dedup.stats(),
+        'history_queue': history_writer.stats(),
+        'generation': generation.stats(),
+        'firestore': datastore.stats(),
+        'storage_backend': storage.name
+    }
+    if explanation_cache is not None:
+        stats['explanation_cache'] = explanation_cache.stats()
+    if webhook_queue is not None:
+        try:
+            stats['webhook_queue'] = webhook_queue.stats()
+        except Exception as e:
+            stats['webhook_queue'] = {'error': str(e)}
+    
+    return jsonify({
+        'status': 'ok' if ready else 'degraded',
+        'checks': checks,
+        'stats': stats
+    }), 200 if ready else 503
+
 @app.route('/firebase-setup')
 def firebase_setup():
     """Page with instructions on how to set up Firebase properly."""
     firebase_status = {
         'initialized': True,
-        'firestore_available': db is not None
+        'firestore_available': datastore.available
     }
     
-    # Check Firebase connection if we can
+    # Check Firebase connection with the cached read-only probe
     firestore_error = None
     if firebase_status['initialized']:
-        try:
-            if db is not None:
-                test_doc = db.collection('test_collection').document('test_document')
-                test_doc.set({'test': 'data', 'timestamp': firestore.SERVER_TIMESTAMP})
-                firebase_status['firestore_working'] = True
-            else:
-                firebase_status['firestore_working'] = False
-        except Exception as e:
-            firebase_status['firestore_working'] = False
-            firestore_error = str(e)
+        probe = storage_probe.result()
+        firebase_status['firestore_working'] = probe['status'] == 'ok'
+        firestore_error = probe.get('error')
     
     # Read service account for project ID
     project_id = None
     try:
-        with open('backend/service_acc.json', 'r') as f:
+        with open(SERVICE_ACCOUNT_PATH, 'r') as f:
             service_acc = json.load(f)
             project_id = service_acc.get('project_id')
     except Exception as e:
@@ -1094,7 +1878,7 @@ def create_user_document():
     user_email = request.user['email']
     
     try:
-        if db is None:
+        if not storage.available:
             return """
             <html>
                 <head>
@@ -1122,44 +1906,44 @@ def create_user_document():
             """
         
         # Check if user document already exists
-        user_ref = db.collection('users').document(user_id)
-        user_doc = user_ref.get()
+        user_data = storage.get_user(user_id)
         
-        if user_doc.exists:
-            user_data = user_doc.to_dict()
+        if user_data is not None:
             existing_fields = ', '.join(user_data.keys())
             
             # Determine if we need to add subscription data
             if 'subscription' not in user_data:
                 logger.info(f"Adding subscription object to existing user document for {user_id}")
-                user_ref.update({
+                storage.update_user(user_id, {
                     'subscription': {
                         'status': 'active',  # Set to active for test purposes
                         'plan': 'premium',
                         'currentPeriodEnd': int(time.time() + 30 * 24 * 60 * 60),  # 30 days from now
-                        'updated_at': firestore.SERVER_TIMESTAMP
+                        'updated_at': NOW
                     },
-                    'updated_at': firestore.SERVER_TIMESTAMP
+                    'updated_at': NOW
                 })
+                entitlement_cache.invalidate(user_id)
                 result = "Updated existing user document with subscription data"
             else:
                 result = f"User document already exists with fields: {existing_fields}"
         else:
             # Create new user document
             logger.info(f"Creating new user document for {user_id}")
-            user_ref.set({
+            storage.create_user(user_id, {
                 'email': user_email,
-                'created_at': firestore.SERVER_TIMESTAMP,
-                'updated_at': firestore.SERVER_TIMESTAMP,
+                'created_at': NOW,
+                'updated_at': NOW,
                 'explanations_generated': 0,
                 'flashcards_generated': 0,
                 'subscription': {
                     'status': 'active',  # Set to active for test purposes
                     'plan': 'premium',
                     'currentPeriodEnd': int(time.time() + 30 * 24 * 60 * 60),  # 30 days from now
-                    'created_at': firestore.SERVER_TIMESTAMP
+                    'created_at': NOW
                 }
             })
+            entitlement_cache.invalidate(user_id)
             result = "Created new user document with initial data"
         
         return f"""
@@ -1211,5 +1995,16 @@ def create_user_document():
         </html>
         """
 
+def create_app(warm=False):
+    """Application factory, e.g. gunicorn 'app:create_app()'.
+
+    Firebase and the background workers start lazily in each process, so the
+    app is safe to preload before forking. Pass warm=True to initialize
+    Firebase immediately instead of on the first request.
+    """
+    if warm:
+        get_db()
+    return app
+
 if __name__ == '__main__':
     app.run(port=5001, debug=True) 
\ No newline at end of file
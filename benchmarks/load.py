@@ -0,0 +1,311 @@
+"""Load-test the Flask API against in-process fakes of Firebase and Stripe.
+
+Firebase Auth token checks and Stripe API calls are replaced by local fakes,
+and Firestore by the SQLite storage backend in a temporary directory, each
+with configurable injected latency. Worker threads drive a weighted mix of
+requests through Flask's test client and the run reports p50/p95/p99
+latency and requests per second per endpoint.
+
+Usage:
+    python benchmarks/load.py --requests 5000 --concurrency 16 --output load.json
+    python benchmarks/load.py --mix explain=1,flashcards=1 --storage-latency 20
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MIX = 'explain=40,flashcards=25,subscription=15,generate=5,create=5,webhook=10'
+
+PASSAGE = ('Photosynthesis is the process plants use to turn sunlight, water and carbon '
+           'dioxide into sugar and oxygen. It happens in the chloroplasts of leaf cells. ')
+
+
+class LatencyProxy:
+    """Wraps an object so every method call first sleeps for latency seconds."""
+
+    def __init__(self, target, latency):
+        self._target = target
+        self._latency = latency
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr) or not self._latency:
+            return attr
+
+        def call(*args, **kwargs):
+            time.sleep(self._latency)
+            return attr(*args, **kwargs)
+        return call
+
+
+def install_fakes(eli5, auth_latency, storage_latency, stripe_latency):
+    """Point the app at local fakes. Must run before the first request."""
+    import stripe
+
+    def verify_id_token(token):
+        # Tokens look like 'bench-<uid>'
+        time.sleep(auth_latency)
+        if not token.startswith('bench-'):
+            raise ValueError('Invalid benchmark token')
+        uid = token[len('bench-'):]
+        return {'uid': uid, 'email': f'{uid}@example.com', 'exp': time.time() + 3600}
+
+    def retrieve_subscription(subscription_id, **params):
+        time.sleep(stripe_latency)
+        return stripe.Subscription.construct_from({
+            'id': subscription_id,
+            'object': 'subscription',
+            'status': 'active',
+            'current_period_end': int(time.time()) + 30 * 86400
+        }, stripe.api_key)
+
+    def retrieve_balance(**params):
+        time.sleep(stripe_latency)
+        return stripe.Balance.construct_from({'object': 'balance'}, stripe.api_key)
+
+    eli5.get_db = lambda: None
+    eli5.auth.verify_id_token = verify_id_token
+    stripe.Subscription.retrieve = retrieve_subscription
+    stripe.Balance.retrieve = retrieve_balance
+    eli5.storage = LatencyProxy(eli5.storage, storage_latency)
+
+
+def seed(eli5, users, cards_per_user):
+    """Create premium users with Stripe IDs and some flashcards."""
+    storage = eli5.storage._target
+    for i in range(users):
+        user_id = f'user{i}'
+        storage.create_user(user_id, {'email': f'{user_id}@example.com', 'created_at': time.time()})
+        storage.save_subscription(user_id, f'cus_{i}', f'sub_{i}', {
+            'status': 'active',
+            'plan': 'premium',
+            'stripe_subscription_id': f'sub_{i}',
+            'currentPeriodEnd': int(time.time()) + 30 * 86400
+        })
+        if cards_per_user:
+            storage.add_generated_flashcards(user_id, [
+                {'front': f'Question {n}', 'back': f'Answer {n}', 'category': 'General',
+                 'created_at': int(time.time()) - n}
+                for n in range(cards_per_user)
+            ])
+
+
+def build_scenarios(users, passages):
+    """Return {name: func(client, rng) -> response}."""
+
+    def auth(rng):
+        return {'Authorization': f'Bearer bench-user{rng.randrange(users)}'}
+
+    def explain(client, rng):
+        # Half the traffic is anonymous; repeated passages exercise the cache
+        headers = auth(rng) if rng.random() < 0.5 else {}
+        text = f'{PASSAGE}(Passage {rng.randrange(passages)}.)'
+        return client.post('/api/explain', json={'text': text}, headers=headers)
+
+    def flashcards(client, rng):
+        return client.get('/api/flashcards?limit=20', headers=auth(rng))
+
+    def subscription(client, rng):
+        return client.get('/api/user/subscription', headers=auth(rng))
+
+    def generate(client, rng):
+        # The fake backend returns the same cards for any text, so allow
+        # duplicates to keep measuring the write path rather than the 200
+        # "already in your deck" answer
+        text = f'{PASSAGE * 3}(Request {rng.getrandbits(64):x}.)'
+        return client.post('/api/generate-flashcards', json={'text': text, 'allow_duplicate': True},
+                           headers=auth(rng))
+
+    def create(client, rng):
+        # Unique fronts go through the duplicate check and on to the write
+        token = f'{rng.getrandbits(64):x}'
+        card = {'front': f'What do plants make in experiment {token}?',
+                'back': f'Sugar and oxygen (sample {token})', 'category': 'Biology'}
+        return client.post('/api/flashcards', json=card, headers=auth(rng))
+
+    def webhook(client, rng):
+        i = rng.randrange(users)
+        event = {
+            'id': f'evt_{rng.getrandbits(64):x}',
+            'object': 'event',
+            'type': 'customer.subscription.updated',
+            'data': {'object': {
+                'id': f'sub_{i}',
+                'object': 'subscription',
+                'customer': f'cus_{i}',
+                'status': 'active',
+                'current_period_end': int(time.time()) + 30 * 86400
+            }}
+        }
+        return client.post('/webhook', data=json.dumps(event), content_type='application/json')
+
+    return {
+        'explain': explain,
+        'flashcards': flashcards,
+        'subscription': subscription,
+        'generate': generate,
+        'create': create,
+        'webhook': webhook
+    }
+
+
+def parse_mix(spec, scenarios):
+    mix = {}
+    for part in spec.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in scenarios:
+            raise SystemExit(f"Unknown scenario '{name}' (choose from {', '.join(scenarios)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(p / 100.0 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'mean_ms': round(sum(latencies) / len(latencies), 2) if latencies else None,
+        'p50_ms': round(percentile(latencies, 50), 2) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95), 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99), 2) if latencies else None,
+        'max_ms': round(latencies[-1], 2) if latencies else None
+    }
+
+
+def run(flask_app, scenarios, mix, total, concurrency, seed_value):
+    """Issue total requests from concurrency threads; return (samples, elapsed)."""
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    remaining = [total]
+    lock = threading.Lock()
+    samples = []
+
+    def worker(index):
+        rng = random.Random(seed_value * 1000 + index)
+        client = flask_app.test_client()
+        local = []
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    break
+                remaining[0] -= 1
+            name = rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            response = scenarios[name](client, rng)
+            # Read streamed bodies fully so their cost is counted
+            response.get_data()
+            local.append((name, (time.perf_counter() - started) * 1000, response.status_code))
+        with lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--requests', type=int, default=2000, help='measured requests')
+    parser.add_argument('--warmup', type=int, default=100, help='unmeasured requests first')
+    parser.add_argument('--concurrency', type=int, default=8, help='client threads')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='weighted scenarios, e.g. explain=3,flashcards=1')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--cards-per-user', type=int, default=50)
+    parser.add_argument('--passages', type=int, default=100, help='distinct explain passages')
+    parser.add_argument('--auth-latency', type=float, default=5.0, help='ms per token verification')
+    parser.add_argument('--storage-latency', type=float, default=10.0, help='ms per storage call')
+    parser.add_argument('--stripe-latency', type=float, default=100.0, help='ms per Stripe API call')
+    parser.add_argument('--generation-latency', type=float, default=50.0, help='ms per fake AI call')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write results as JSON to this path')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='eli5-load-')
+    # The app reads its configuration at import time
+    os.environ.update({
+        'STRIPE_SECRET_KEY': 'sk_test_benchmark',
+        'STRIPE_PUBLISHABLE_KEY': 'pk_test_benchmark',
+        'STORAGE_BACKEND': 'sqlite',
+        'SQLITE_PATH': os.path.join(workdir, 'storage.sqlite3'),
+        'WEBHOOK_QUEUE_PATH': os.path.join(workdir, 'webhook_queue.sqlite3'),
+        'EXPLANATION_CACHE_BACKEND': 'memory',
+        'GENERATION_BACKEND': 'fake',
+        'FAKE_GENERATION_LATENCY': str(args.generation_latency / 1000)
+    })
+    os.environ.pop('STRIPE_WEBHOOK_SECRET', None)
+    sys.path.insert(0, ROOT)
+
+    # The app logs and prints on every request; keep the report readable
+    import logging
+    logging.disable(logging.INFO)
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        import app as eli5
+        install_fakes(eli5, args.auth_latency / 1000, args.storage_latency / 1000,
+                      args.stripe_latency / 1000)
+        seed(eli5, args.users, args.cards_per_user)
+
+        flask_app = eli5.create_app()
+        scenarios = build_scenarios(args.users, args.passages)
+        mix = parse_mix(args.mix, scenarios)
+
+        run(flask_app, scenarios, mix, args.warmup, args.concurrency, args.seed + 1)
+        samples, elapsed = run(flask_app, scenarios, mix, args.requests, args.concurrency, args.seed)
+
+        # Let background writers finish so their stats are complete
+        eli5.history_writer.drain()
+        deadline = time.time() + 30
+        while eli5.webhook_queue is not None and time.time() < deadline:
+            queue_stats = eli5.webhook_queue.stats()
+            if not queue_stats['pending'] and not queue_stats['processing']:
+                break
+            time.sleep(0.1)
+        app_stats = flask_app.test_client().get('/api/health/ready').get_json()['stats']
+
+    by_scenario = {}
+    for name, latency, status in samples:
+        entry = by_scenario.setdefault(name, {'latencies': [], 'errors': 0})
+        entry['latencies'].append(latency)
+        entry['errors'] += int(status >= 400)
+
+    results = {
+        'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        'python': sys.version.split()[0],
+        'elapsed_seconds': round(elapsed, 3),
+        'overall': summarize([latency for _, latency, _ in samples],
+                             sum(e['errors'] for e in by_scenario.values()), elapsed),
+        'scenarios': {name: summarize(e['latencies'], e['errors'], elapsed)
+                      for name, e in sorted(by_scenario.items())},
+        'app_stats': {key: app_stats.get(key) for key in
+                      ('token_cache', 'entitlement_cache', 'history_queue', 'generation',
+                       'explanation_cache', 'webhook_queue', 'flashcard_dedup')}
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
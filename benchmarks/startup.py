@@ -0,0 +1,82 @@
+"""Measure cold-start cost of the Flask app.
+
+Each run starts a fresh interpreter, imports app.py and issues the first
+requests through Flask's test client, so the numbers reflect what a newly
+forked or autoscaled worker pays before serving traffic.
+
+Usage:
+    python benchmarks/startup.py --runs 10 --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs inside the child interpreter and prints one JSON line of timings
+PROBE = r'''
+import json, time
+started = time.perf_counter()
+import app as eli5
+imported = time.perf_counter()
+flask_app = eli5.create_app()
+client = flask_app.test_client()
+
+t = time.perf_counter()
+client.get('/api/health')
+health = time.perf_counter() - t
+
+t = time.perf_counter()
+client.post('/api/explain', json={'text': 'Photosynthesis is how plants turn light into food.'})
+explain = time.perf_counter() - t
+
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'first_health_ms': health * 1000,
+    'first_explain_ms': explain * 1000,
+}))
+'''
+
+
+def summarize(values):
+    values = sorted(values)
+    return {
+        'median': round(statistics.median(values), 2),
+        'min': round(values[0], 2),
+        'max': round(values[-1], 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--output', help='write results as JSON to this path')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    # The app refuses to start without Stripe keys; no Stripe call is made here
+    env.setdefault('STRIPE_SECRET_KEY', 'sk_test_benchmark')
+    env.setdefault('STRIPE_PUBLISHABLE_KEY', 'pk_test_benchmark')
+
+    samples = []
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+
+    results = {
+        'runs': args.runs,
+        'python': sys.version.split()[0],
+        **{key: summarize([s[key] for s in samples]) for key in samples[0]}
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
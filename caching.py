@@ -0,0 +1,262 @@
+import hashlib
+import os
+import re
+import threading
+import time
+import unicodedata
+import logging
+from collections import OrderedDict
+
+from sqlite_connections import ThreadLocalConnections
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after a TTL."""
+
+    def __init__(self, max_size=10000, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.time():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None, expires_at=None):
+        if expires_at is None:
+            expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+class MemoryCacheBackend:
+    """Per-process explanation cache backed by a TTLCache."""
+
+    name = 'memory'
+
+    def __init__(self, max_size=10000, ttl=86400):
+        self._cache = TTLCache(max_size=max_size, ttl=ttl)
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value, ttl):
+        self._cache.set(key, value, ttl=ttl)
+
+    def stats(self):
+        return self._cache.stats()
+
+
+class RedisCacheBackend:
+    """Explanation cache shared through Redis (or any Redis-compatible server).
+
+    Entries expire with SETEX; size-based eviction is left to the server's
+    maxmemory-policy (allkeys-lru is recommended).
+    """
+
+    name = 'redis'
+
+    def __init__(self, url, prefix='eli5:explain:'):
+        import redis
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self._client.get(self.prefix + key)
+        return value.decode('utf-8') if value is not None else None
+
+    def set(self, key, value, ttl):
+        self._client.setex(self.prefix + key, int(ttl), value.encode('utf-8'))
+
+    def stats(self):
+        return {}
+
+
+class DiskCacheBackend:
+    """Explanation cache in a local SQLite file, shared by all workers on a host.
+
+    Entries expire after their TTL and the least recently used rows are
+    pruned once the table grows past max_size.
+    """
+
+    name = 'disk'
+
+    def __init__(self, path, max_size=100000, prune_every=100):
+        self.path = path
+        self.max_size = max_size
+        self.prune_every = prune_every
+        self._writes = 0
+        self._connections = ThreadLocalConnections(path, timeout=5.0, create_schema=self._create_schema)
+
+    def _create_schema(self, conn):
+        conn.execute('PRAGMA journal_mode=WAL')
+        with conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS explanation_cache ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                'expires_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+            )
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS explanation_cache_accessed '
+                'ON explanation_cache (accessed_at)'
+            )
+
+    def _connect(self):
+        return self._connections.get()
+
+    def get(self, key):
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute(
+            'SELECT value, expires_at FROM explanation_cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        with conn:
+            if expires_at <= now:
+                conn.execute('DELETE FROM explanation_cache WHERE key = ?', (key,))
+                return None
+            conn.execute('UPDATE explanation_cache SET accessed_at = ? WHERE key = ?', (now, key))
+        return value
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO explanation_cache (key, value, expires_at, accessed_at) '
+                'VALUES (?, ?, ?, ?)', (key, value, now + ttl, now)
+            )
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            self.prune()
+
+    def prune(self):
+        """Drop expired rows, then the least recently used rows beyond max_size."""
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM explanation_cache WHERE expires_at <= ?', (time.time(),))
+            conn.execute(
+                'DELETE FROM explanation_cache WHERE key IN ('
+                'SELECT key FROM explanation_cache ORDER BY accessed_at DESC '
+                'LIMIT -1 OFFSET ?)', (self.max_size,)
+            )
+
+    def stats(self):
+        size = self._connect().execute('SELECT COUNT(*) FROM explanation_cache').fetchone()[0]
+        return {'size': size, 'max_size': self.max_size}
+
+
+_whitespace = re.compile(r'\s+')
+
+
+def normalize_text(text):
+    """Normalize text so trivially different selections share a cache key."""
+    return _whitespace.sub(' ', unicodedata.normalize('NFKC', text)).strip()
+
+
+class ExplanationCache:
+    """Content-addressed cache of generated explanations.
+
+    Keys are a SHA-256 of the normalized input, namespaced by the generation
+    backend so switching backends doesn't serve stale output. Backend errors
+    are logged and treated as misses so the cache never fails a request.
+    """
+
+    def __init__(self, backend, namespace, ttl=86400):
+        self.backend = backend
+        self.namespace = namespace
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def key_for(self, text):
+        digest = hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+        return f"{self.namespace}:{digest}"
+
+    def get(self, text):
+        try:
+            value = self.backend.get(self.key_for(text))
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Explanation cache read error: {str(e)}")
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, text, explanation):
+        try:
+            self.backend.set(self.key_for(text), explanation, self.ttl)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Explanation cache write error: {str(e)}")
+
+    def stats(self):
+        try:
+            backend_stats = self.backend.stats()
+        except Exception:
+            backend_stats = {}
+        return dict(backend_stats, backend=self.backend.name,
+                    hits=self.hits, misses=self.misses, errors=self.errors)
+
+
+def create_explanation_cache(namespace):
+    """Build the explanation cache selected by EXPLANATION_CACHE_BACKEND.
+
+    Returns None when caching is disabled ('none').
+    """
+    backend_name = os.getenv('EXPLANATION_CACHE_BACKEND', 'memory')
+    ttl = int(os.getenv('EXPLANATION_CACHE_TTL', '86400'))
+    max_size = int(os.getenv('EXPLANATION_CACHE_SIZE', '10000'))
+
+    if backend_name == 'none':
+        return None
+    if backend_name == 'memory':
+        backend = MemoryCacheBackend(max_size=max_size, ttl=ttl)
+    elif backend_name == 'redis':
+        backend = RedisCacheBackend(os.getenv('EXPLANATION_CACHE_URL', 'redis://localhost:6379/0'))
+    elif backend_name == 'disk':
+        backend = DiskCacheBackend(os.getenv('EXPLANATION_CACHE_PATH', 'explanation_cache.sqlite3'),
+                                   max_size=max_size)
+    else:
+        raise ValueError(f"Unknown explanation cache backend: {backend_name}")
+    return ExplanationCache(backend, namespace, ttl=ttl)
@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+
+from flask import has_request_context, request
+from google.api_core import retry as api_retry
+
+
+class Datastore:
+    """Single place where the app talks to Firestore.
+
+    Wraps the per-process client from client_factory and applies one timeout
+    to every call, plus a retry policy for reads. Writes keep the client
+    library's default retry because increments and add() aren't idempotent.
+    Calls are counted and timed per Flask endpoint (or 'background' outside
+    a request) so Firestore I/O can be tuned from one spot.
+    """
+
+    def __init__(self, client_factory, timeout=10.0, retry_deadline=20.0):
+        self._client_factory = client_factory
+        self.timeout = timeout
+        self.retry = api_retry.Retry(
+            predicate=api_retry.if_transient_error,
+            initial=0.1,
+            maximum=2.0,
+            multiplier=2.0,
+            deadline=retry_deadline
+        )
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    @property
+    def client(self):
+        """The shared Firestore client, or None if Firebase is unavailable."""
+        return self._client_factory()
+
+    @property
+    def available(self):
+        return self.client is not None
+
+    def collection(self, *path):
+        return self.client.collection(*path)
+
+    def document(self, *path):
+        return self.client.document(*path)
+
+    def batch(self):
+        return self.client.batch()
+
+    def _record(self, operation, elapsed, error):
+        route = request.endpoint if has_request_context() and request.endpoint else 'background'
+        with self._lock:
+            metrics = self._metrics.setdefault(route, {}).setdefault(
+                operation, {'calls': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            metrics['calls'] += 1
+            metrics['errors'] += int(error)
+            elapsed_ms = elapsed * 1000
+            metrics['total_ms'] += elapsed_ms
+            metrics['max_ms'] = max(metrics['max_ms'], elapsed_ms)
+
+    def _call(self, operation, func, *args, read=False, **kwargs):
+        if read:
+            kwargs['retry'] = self.retry
+        started = time.monotonic()
+        error = False
+        try:
+            return func(*args, timeout=self.timeout, **kwargs)
+        except Exception:
+            error = True
+            raise
+        finally:
+            self._record(operation, time.monotonic() - started, error)
+
+    def get(self, doc_ref):
+        """Fetch a DocumentSnapshot."""
+        return self._call('get', doc_ref.get, read=True)
+
+    def get_all(self, doc_refs, field_paths=None):
+        """Fetch several DocumentSnapshots in one round trip."""
+        def fetch(**kwargs):
+            return list(self.client.get_all(doc_refs, field_paths=field_paths, **kwargs))
+        return self._call('get_all', fetch, read=True)
+
+    def set(self, doc_ref, data, merge=False):
+        return self._call('set', doc_ref.set, data, merge=merge)
+
+    def update(self, doc_ref, data):
+        return self._call('update', doc_ref.update, data)
+
+    def add(self, collection_ref, data):
+        """Add a document and return its DocumentReference."""
+        return self._call('add', collection_ref.add, data)[1]
+
+    def query(self, query):
+        """Run a query and return the list of DocumentSnapshots."""
+        return self._call('query', query.get, read=True)
+
+    def stream(self, query, timeout=None):
+        """Yield DocumentSnapshots from a query as they arrive.
+
+        timeout bounds the whole stream (default: the datastore timeout) and
+        the recorded latency covers it too.
+        """
+        started = time.monotonic()
+        error = False
+        try:
+            for snapshot in query.stream(retry=self.retry, timeout=timeout or self.timeout):
+                yield snapshot
+        except Exception:
+            error = True
+            raise
+        finally:
+            self._record('stream', time.monotonic() - started, error)
+
+    def commit(self, batch):
+        return self._call('commit', batch.commit)
+
+    def stats(self):
+        """Per-route call counts and latencies."""
+        with self._lock:
+            return {
+                route: {
+                    operation: dict(metrics,
+                                    total_ms=round(metrics['total_ms'], 1),
+                                    max_ms=round(metrics['max_ms'], 1),
+                                    avg_ms=round(metrics['total_ms'] / metrics['calls'], 1))
+                    for operation, metrics in operations.items()
+                }
+                for route, operations in self._metrics.items()
+            }
+
+
+def create_datastore(client_factory):
+    """Build the Datastore using FIRESTORE_TIMEOUT and FIRESTORE_RETRY_DEADLINE."""
+    return Datastore(
+        client_factory,
+        timeout=float(os.getenv('FIRESTORE_TIMEOUT', '10')),
+        retry_deadline=float(os.getenv('FIRESTORE_RETRY_DEADLINE', '20'))
+    )
@@ -0,0 +1,125 @@
+import re
+import zlib
+
+from caching import normalize_text
+from summarization import STOPWORDS
+
+_punctuation = re.compile(r'[^\w\s]')
+
+# 32 one-permutation MinHash bins split into 8 LSH bands of 4: texts with
+# Jaccard similarity 0.8 share a band ~98% of the time, at 0.3 under 7%.
+# Bands only select candidates; duplicates are confirmed exactly.
+NUM_BINS = 32
+BANDS = 8
+ROWS = NUM_BINS // BANDS
+
+
+def words(text):
+    """Lowercased words of text without punctuation."""
+    return _punctuation.sub(' ', normalize_text(text).lower()).split()
+
+
+def shingles(text, size=4):
+    """Character shingles of the text's content words (all words if it has none).
+
+    Leaving out stopwords keeps shared templates like "What is the ..." from
+    making unrelated cards candidates of each other.
+    """
+    all_words = words(text)
+    text = ' '.join([word for word in all_words if word not in STOPWORDS] or all_words)
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def signature(text):
+    """One-permutation MinHash signature of text.
+
+    Each shingle hash is assigned to a bin by its low bits and the minimum
+    per bin is kept, so a signature costs one hash per shingle. Empty bins
+    borrow from the next non-empty bin (densification) so short texts still
+    compare well.
+    """
+    bins = [None] * NUM_BINS
+    for shingle in shingles(text):
+        h = zlib.crc32(shingle.encode('utf-8'))
+        b = h % NUM_BINS
+        value = h // NUM_BINS
+        if bins[b] is None or value < bins[b]:
+            bins[b] = value
+    if all(value is None for value in bins):
+        return tuple([-1] * NUM_BINS)
+    filled = []
+    for i in range(NUM_BINS):
+        distance = 0
+        while bins[(i + distance) % NUM_BINS] is None:
+            distance += 1
+        filled.append((bins[(i + distance) % NUM_BINS] << 5) + distance)
+    return tuple(filled)
+
+
+def band_keys(sig):
+    """Short string keys of a signature's LSH bands, suitable for storing and querying."""
+    return [f'{band}:{zlib.crc32(repr(sig[band * ROWS:(band + 1) * ROWS]).encode("ascii")):08x}'
+            for band in range(BANDS)]
+
+
+def exact_key(card):
+    """Key shared by cards whose front and back have the same words."""
+    content = ' '.join(words(card['front'])) + '\n' + ' '.join(words(card.get('back') or ''))
+    return f'x:{zlib.crc32(content.encode("utf-8")):08x}'
+
+
+def card_bands(card):
+    """Keys to store with a {'front', 'back'} card: its exact_key, then the LSH bands of its front."""
+    return [exact_key(card)] + band_keys(signature(card['front']))
+
+
+def jaccard(a, b):
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def card_similarity(a, b):
+    """Exact similarity of two cards: the lower of their front and back word-set Jaccard.
+
+    Whole words are compared, so "World War I" and "World War II" or "DNA
+    polymerase" and "RNA polymerase" stay apart however many characters
+    they share.
+    """
+    return min(jaccard(set(words(a['front'])), set(words(b['front']))),
+               jaccard(set(words(a.get('back') or '')), set(words(b.get('back') or ''))))
+
+
+class NearDuplicateIndex:
+    """LSH index of flashcards (e.g. one generated batch).
+
+    Lookups only compare against cards sharing at least one band, and
+    report a match only when card_similarity() reaches the threshold.
+    """
+
+    def __init__(self, threshold=0.8):
+        self.threshold = threshold
+        self._cards = {}
+        self._buckets = {}
+
+    def __len__(self):
+        return len(self._cards)
+
+    def find(self, card, bands=None):
+        """Return the key of the most similar indexed card at or above threshold, or None."""
+        candidates = set()
+        for band in bands or card_bands(card):
+            candidates.update(self._buckets.get(band, ()))
+        best, best_score = None, self.threshold
+        for key in candidates:
+            score = card_similarity(card, self._cards[key])
+            if score >= best_score:
+                best, best_score = key, score
+        return best
+
+    def add(self, key, card, bands=None):
+        self._cards[key] = card
+        for band in bands or card_bands(card):
+            self._buckets.setdefault(band, []).append(key)
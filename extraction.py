@@ -0,0 +1,235 @@
+import codecs
+import re
+from html.parser import HTMLParser
+
+# Subtrees whose text is never content. <form> is not one of them: ASP.NET
+# and similar frameworks wrap the whole page body in a form.
+SKIP_TAGS = {
+    'script', 'style', 'noscript', 'template', 'svg', 'canvas', 'iframe', 'object',
+    'head', 'nav', 'footer', 'aside', 'button', 'select', 'textarea', 'menu', 'dialog'
+}
+
+# Tags allowed in <head>; any other start tag implies </head>, which is optional
+HEAD_TAGS = {'title', 'meta', 'link', 'base', 'style', 'script', 'noscript', 'template'}
+
+# Tags that end one text block and start the next
+BLOCK_TAGS = {
+    'p', 'div', 'section', 'article', 'main', 'header', 'li', 'ul', 'ol', 'dl', 'dt', 'dd',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'blockquote', 'pre', 'table', 'tr', 'td', 'th',
+    'figure', 'figcaption', 'br', 'hr', 'body'
+}
+
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta',
+             'param', 'source', 'track', 'wbr'}
+
+CONTENT_TAGS = {'article', 'main'}
+
+# Page-level containers: never skipped or penalized, whatever their attributes
+# say (CMSs put classes like "comments-open" or "has-sidebar" on <body>)
+EXEMPT_TAGS = {'html', 'body', 'article', 'main'}
+
+# ARIA roles equivalent to the skipped tags
+SKIP_ROLES = {'navigation', 'complementary', 'contentinfo', 'banner', 'search', 'menu',
+              'menubar', 'dialog', 'alertdialog'}
+
+# Words of class/id tokens (split at '-' and '_') that mark navigation, ads
+# and other page chrome. Matching blocks are down-scored, not dropped.
+BOILERPLATE_WORDS = {
+    'comment', 'comments', 'sidebar', 'footer', 'masthead', 'navbar', 'nav', 'menu', 'share',
+    'sharing', 'social', 'cookie', 'cookies', 'consent', 'banner', 'promo', 'advert', 'ad',
+    'ads', 'advertisement', 'sponsor', 'sponsored', 'related', 'recommended', 'subscribe',
+    'newsletter', 'breadcrumb', 'breadcrumbs', 'popup', 'modal', 'signup', 'paywall', 'byline',
+    'toolbar', 'widget', 'widgets'
+}
+BOILERPLATE_PENALTY = 0.2
+TOKEN_SEPARATOR = re.compile(r'[-_]')
+
+SENTENCE_END = re.compile(r'[.!?]["\')\]]?(\s|$)')
+
+
+class ContentExtractor(HTMLParser):
+    """Incremental HTML-to-text extractor that keeps the main content.
+
+    Feed HTML in chunks with feed(); text is split into blocks at block-level
+    tags. Script, navigation and hidden subtrees are skipped, and each block
+    is scored by length, punctuation, link density and whether it sits
+    inside <article>/<main>. Blocks inside elements whose class or id names
+    page chrome (sidebar, comments, share, ...) are down-scored rather than
+    dropped, so a misleading class on a wrapper can't remove the content.
+    Only the best max_blocks blocks are retained, so memory stays bounded
+    however large the page is.
+    """
+
+    def __init__(self, max_blocks=300):
+        super().__init__(convert_charrefs=True)
+        self.max_blocks = max_blocks
+        self.blocks = []  # (position, score, text)
+        self.title = ''
+        self._parts = []
+        self._link_chars = 0
+        self._in_link = 0
+        self._in_title = False
+        self._content_depth = 0
+        self._skip_tag = None
+        self._skip_nesting = 0
+        self._penalty_tag = None
+        self._penalty_nesting = 0
+        self._position = 0
+
+    @staticmethod
+    def _is_hidden(attrs):
+        for name, value in attrs:
+            if name == 'role' and value and value.strip().lower() in SKIP_ROLES:
+                return True
+        return ('aria-hidden', 'true') in attrs
+
+    @staticmethod
+    def _is_boilerplate(attrs):
+        for name, value in attrs:
+            if name in ('class', 'id') and value:
+                for token in value.lower().split():
+                    if not BOILERPLATE_WORDS.isdisjoint(TOKEN_SEPARATOR.split(token)):
+                        return True
+        return False
+
+    def handle_starttag(self, tag, attrs):
+        # The title lives in the skipped <head> but is kept as a fallback
+        if tag == 'title':
+            self._in_title = True
+            return
+        if self._skip_tag == 'head' and tag not in HEAD_TAGS:
+            self._skip_tag = None
+        if self._skip_tag is not None:
+            if tag == self._skip_tag:
+                self._skip_nesting += 1
+            return
+        if tag in BLOCK_TAGS:
+            self._flush()
+        if tag in VOID_TAGS:
+            return
+        if tag in SKIP_TAGS or (tag not in EXEMPT_TAGS and self._is_hidden(attrs)):
+            self._skip_tag = tag
+            self._skip_nesting = 1
+            return
+        if self._penalty_tag is not None:
+            if tag == self._penalty_tag:
+                self._penalty_nesting += 1
+        elif tag not in EXEMPT_TAGS and self._is_boilerplate(attrs):
+            # Keep the element's text in blocks of its own so only it is penalized
+            self._flush()
+            self._penalty_tag = tag
+            self._penalty_nesting = 1
+        if tag in CONTENT_TAGS:
+            self._content_depth += 1
+        elif tag == 'a':
+            self._in_link += 1
+
+    def handle_startendtag(self, tag, attrs):
+        if self._skip_tag is None and tag in BLOCK_TAGS:
+            self._flush()
+
+    def handle_endtag(self, tag):
+        if tag == 'title':
+            self._in_title = False
+            return
+        if self._skip_tag is not None:
+            if tag == self._skip_tag:
+                self._skip_nesting -= 1
+                if self._skip_nesting == 0:
+                    self._skip_tag = None
+            return
+        if tag in BLOCK_TAGS:
+            self._flush()
+        if tag == self._penalty_tag:
+            self._penalty_nesting -= 1
+            if self._penalty_nesting == 0:
+                self._flush()
+                self._penalty_tag = None
+        if tag in CONTENT_TAGS:
+            self._content_depth = max(0, self._content_depth - 1)
+        elif tag == 'a':
+            self._in_link = max(0, self._in_link - 1)
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+            return
+        if self._skip_tag is not None:
+            return
+        self._parts.append(data)
+        if self._in_link:
+            self._link_chars += len(data.strip())
+
+    def _score(self, text):
+        length = len(text)
+        sentences = len(SENTENCE_END.findall(text))
+        # Menu entries, captions and buttons are short and unpunctuated
+        if length < 25 and not sentences:
+            return 0
+        link_density = min(1.0, self._link_chars / length)
+        if link_density > 0.5:
+            return 0
+        score = (length + 20 * sentences + 10 * text.count(',')) * (1 - link_density)
+        if self._content_depth:
+            score *= 1.5
+        if self._penalty_tag is not None:
+            score *= BOILERPLATE_PENALTY
+        return score
+
+    def _flush(self):
+        if not self._parts:
+            return
+        text = ' '.join(''.join(self._parts).split())
+        score = self._score(text) if text else 0
+        self._parts = []
+        self._link_chars = 0
+        if not score:
+            return
+        self.blocks.append((self._position, score, text))
+        self._position += 1
+        if len(self.blocks) > self.max_blocks:
+            self.blocks.remove(min(self.blocks, key=lambda block: block[1]))
+
+    def close(self):
+        super().close()
+        self._flush()
+
+    def text(self, max_chars=5000, min_relative_score=0.15):
+        """Return the main content in document order, cut to max_chars.
+
+        Blocks scoring below min_relative_score of the best block are
+        treated as boilerplate and left out.
+        """
+        if not self.blocks:
+            return ' '.join(self.title.split())
+        cutoff = max(block[1] for block in self.blocks) * min_relative_score
+        selected = []
+        used = 0
+        for _, score, text in sorted(self.blocks):
+            if score < cutoff:
+                continue
+            if used + len(text) > max_chars:
+                if not selected:
+                    # A single huge block: cut it at the last word boundary
+                    selected.append(text[:max_chars].rsplit(' ', 1)[0])
+                break
+            selected.append(text)
+            used += len(text) + 2
+        return '\n\n'.join(selected)
+
+
+def extract_main_text(chunks, max_chars=5000):
+    """Extract the main readable text from HTML given as a string or an iterable of chunks."""
+    extractor = ContentExtractor()
+    if isinstance(chunks, str):
+        html = chunks
+        chunks = (html[i:i + 65536] for i in range(0, len(html), 65536))
+    # Multi-byte characters may be split across byte chunks
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    for chunk in chunks:
+        if isinstance(chunk, bytes):
+            chunk = decoder.decode(chunk)
+        extractor.feed(chunk)
+    extractor.feed(decoder.decode(b'', final=True))
+    extractor.close()
+    return extractor.text(max_chars=max_chars)
@@ -0,0 +1,192 @@
+"""Offline flashcard generation from plain text.
+
+Builds three kinds of cards, in order of preference:
+
+- definitions: sentences of the form "<term> is a/an/the ...", "<term>
+  refers to ...", "<term> is defined as ..."
+- acronyms: "Full Name (FN)" expansions
+- cloze: the best sentence mentioning each top keyphrase, with the phrase
+  blanked out
+
+Keyphrases come from runs of content words between stopwords and
+punctuation, as in RAKE, with repeated phrases ranked first. Everything is
+deterministic: the same text always yields the same cards.
+"""
+import re
+from collections import Counter
+
+from summarization import STOPWORDS, split_sentences
+
+DEFINITION_PATTERN = re.compile(
+    r'^(?P<term>(?:the |an? )?[\w][\w\s\'-]{1,60}?)\s*(?:,[^,]{1,80},\s*)?'
+    r'\b(?P<verb>is defined as|are defined as|refers to|refer to|is known as|means|'
+    r'(?:is|are) (?=(?:a|an|the|one|any|some|two|several)\b))\s*(?P<definition>.{15,})$',
+    re.IGNORECASE
+)
+ACRONYM_PATTERN = re.compile(r'((?:[A-Za-z][\w-]*\s+){1,8}?)\(([A-Z][A-Za-z]{1,7})\)')
+PHRASE_SPLIT = re.compile(r'[^\w\s\'-]|\b\d+\b')
+WORD = re.compile(r"[A-Za-z][A-Za-z'-]*")
+
+# Sentence openers that make a "<term> is ..." match meaningless
+NON_TERMS = {'it', 'this', 'that', 'there', 'they', 'he', 'she', 'we', 'you', 'i', 'these',
+             'those', 'here', 'what', 'which', 'who', 'one', 'its', 'his', 'her', 'their'}
+
+
+def _clean(text):
+    return ' '.join(text.split()).strip(' ,;:')
+
+
+def _capitalize(text):
+    return text[:1].upper() + text[1:]
+
+
+def definition_cards(sentences):
+    cards = []
+    for sentence in sentences:
+        match = DEFINITION_PATTERN.match(sentence)
+        if not match:
+            continue
+        term = _clean(re.sub(r'^(?:the|an?)\s+', '', match.group('term'), flags=re.IGNORECASE))
+        words = term.split()
+        if not words or len(words) > 6 or term.lower() in NON_TERMS or words[0].lower() in NON_TERMS:
+            continue
+        if all(word.lower() in STOPWORDS for word in words):
+            continue
+        definition = _clean(match.group('definition')).rstrip('.')
+        verb = 'are' if match.group('verb').lower().startswith('are') else 'is'
+        cards.append({
+            'term': term,
+            'front': f'What {verb} {term}?',
+            'back': _capitalize(definition) + '.',
+            'category': 'Terminology'
+        })
+    return cards
+
+
+def acronym_cards(text):
+    cards = []
+    seen = set()
+    for match in ACRONYM_PATTERN.finditer(text):
+        acronym = match.group(2)
+        if acronym in seen:
+            continue
+        words = match.group(1).split()
+        initials = acronym.lower()
+        # The shortest run of preceding words starting with the acronym's first
+        # letter whose initials appear in the acronym in order, e.g.
+        # "Adenosine triphosphate (ATP)"
+        for size in range(2, min(len(words), len(initials)) + 1):
+            expansion = words[-size:]
+            if expansion[0][0].lower() != initials[0]:
+                continue
+            position = 0
+            for word in expansion:
+                position = initials.find(word[0].lower(), position)
+                if position < 0:
+                    break
+                position += 1
+            else:
+                seen.add(acronym)
+                cards.append({
+                    'term': acronym,
+                    'front': f'What does {acronym} stand for?',
+                    'back': ' '.join(expansion),
+                    'category': 'Terminology'
+                })
+                break
+    return cards
+
+
+def keyphrases(sentences, limit=20):
+    """Return up to limit key phrases, best first.
+
+    Candidates are 1-3 word n-grams of content words (runs between
+    stopwords and punctuation, as in RAKE). Phrases that repeat are
+    preferred, and a phrase is dropped when a longer phrase containing it
+    occurs just as often.
+    """
+    counts = Counter()
+    first_seen = {}
+    surface = {}
+    position = 0
+    for sentence in sentences:
+        for fragment in PHRASE_SPLIT.split(sentence):
+            run = []
+            for word in fragment.split() + [None]:
+                if word is not None and word.lower() not in STOPWORDS and WORD.fullmatch(word):
+                    run.append(word)
+                    continue
+                for size in range(1, min(3, len(run)) + 1):
+                    for i in range(len(run) - size + 1):
+                        key = tuple(w.lower() for w in run[i:i + size])
+                        if len(' '.join(key)) < 4:
+                            continue
+                        counts[key] += 1
+                        if key not in first_seen:
+                            first_seen[key] = position
+                            surface[key] = ' '.join(run[i:i + size])
+                        position += 1
+                run = []
+
+    # Highest count of any longer phrase containing each shorter phrase
+    container_counts = {}
+    for key, count in counts.items():
+        for size in range(1, len(key)):
+            for i in range(len(key) - size + 1):
+                sub = key[i:i + size]
+                if count > container_counts.get(sub, 0):
+                    container_counts[sub] = count
+
+    repeated = [key for key, count in counts.items()
+                if count > 1 and container_counts.get(key, 0) < count]
+    repeated.sort(key=lambda key: (-counts[key] * (1 + 0.5 * (len(key) - 1)), first_seen[key]))
+    phrases = repeated[:limit]
+    if len(phrases) < limit:
+        # Pad with one-off two-word phrases, which are usually noun phrases
+        singles = sorted((key for key in counts if counts[key] == 1 and len(key) == 2),
+                         key=lambda key: first_seen[key])
+        phrases += singles[:limit - len(phrases)]
+    return [surface[key] for key in phrases]
+
+
+def cloze_cards(sentences, phrases, covered):
+    cards = []
+    used_sentences = set()
+    for phrase in phrases:
+        if phrase.lower() in covered:
+            continue
+        pattern = re.compile(r'\b' + re.escape(phrase) + r'\b', re.IGNORECASE)
+        for index, sentence in enumerate(sentences):
+            if index in used_sentences or not 40 <= len(sentence) <= 300:
+                continue
+            if not pattern.search(sentence):
+                continue
+            front = pattern.sub('_____', sentence, count=1)
+            cards.append({
+                'term': phrase,
+                'front': f'Fill in the blank: {front}',
+                'back': phrase,
+                'category': 'Key Concepts'
+            })
+            used_sentences.add(index)
+            covered.add(phrase.lower())
+            break
+    return cards
+
+
+def generate_flashcards(text, max_cards=10):
+    """Return up to max_cards {'front', 'back', 'category'} cards for text."""
+    sentences = split_sentences(text)
+    cards = definition_cards(sentences) + acronym_cards(text)
+
+    covered = set()
+    unique = []
+    for card in cards:
+        if card['term'].lower() not in covered:
+            covered.add(card['term'].lower())
+            unique.append(card)
+
+    if len(unique) < max_cards:
+        unique += cloze_cards(sentences, keyphrases(sentences), covered)
+
+    return [{key: card[key] for key in ('front', 'back', 'category')} for card in unique[:max_cards]]
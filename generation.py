@@ -0,0 +1,360 @@
+"""Generation backends and the pipeline that runs them for request handlers.
+
+The pipeline caps concurrent backend calls, applies a timeout and coalesces
+identical requests, and coroutine backends share one event loop per
+process. It does not free the request thread: run() and stream() wait for
+the backend, so under a sync WSGI server each worker thread serves one
+generation at a time and throughput scales with worker threads, not with
+outstanding backend I/O. There is no non-blocking entry point (async views
+or a gevent-aware wait) yet; until there is, size gunicorn --threads for
+the expected number of concurrent generations.
+"""
+import asyncio
+import concurrent.futures
+import hashlib
+import inspect
+import os
+import queue
+import threading
+import time
+import logging
+
+import flashcard_engine
+from caching import normalize_text
+from summarization import summarize
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationError(Exception):
+    """Base error for the generation pipeline."""
+
+
+class GenerationTimeout(GenerationError):
+    """The backend did not produce a result within the request timeout."""
+
+
+class GenerationOverloaded(GenerationError):
+    """All generation slots stayed busy for the whole request timeout."""
+
+
+class GenerationBackend:
+    """Interface for explanation and flashcard generators.
+
+    Methods may be plain functions (run on the pipeline's thread pool) or
+    coroutines (run on the pipeline's event loop), so I/O-bound backends can
+    keep many model calls outstanding without holding a thread each.
+
+    Backends that can produce tokens incrementally may also define
+    stream_explanation(text) as a generator or async generator of text chunks.
+    """
+
+    name = 'base'
+
+    def explain(self, text):
+        """Return a simple explanation of text."""
+        raise NotImplementedError
+
+    def generate_flashcards(self, text):
+        """Return a list of {'front', 'back', 'category'} cards for text."""
+        raise NotImplementedError
+
+
+class FakeBackend(GenerationBackend):
+    """Local stand-in for a model backend, with optional simulated latency."""
+
+    name = 'fake'
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    @staticmethod
+    def _explanation(text):
+        if len(text) < 100:
+            return f"Simply put: {text}"
+        first_sentence = text.split('. ')[0] + '.'
+        return f"In simple terms, this is about {first_sentence} The key idea is to understand this concept as if explaining to a 5-year-old."
+
+    async def explain(self, text):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._explanation(text)
+
+    async def stream_explanation(self, text):
+        # Spread the simulated latency across the words, like token streaming
+        words = self._explanation(text).split(' ')
+        delay = self.latency / len(words)
+        for i, word in enumerate(words):
+            if delay:
+                await asyncio.sleep(delay)
+            yield word if i == 0 else ' ' + word
+
+    async def generate_flashcards(self, text):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        return [
+            {
+                "front": "What is the main purpose of ELI5?",
+                "back": "To explain complex concepts in simple terms that a 5-year-old could understand.",
+                "category": "General"
+            },
+            {
+                "front": "What does ELI5 stand for?",
+                "back": "Explain Like I'm 5",
+                "category": "Terminology"
+            },
+            {
+                "front": "What is the benefit of using flashcards?",
+                "back": "Flashcards use active recall and spaced repetition to enhance learning and memory retention.",
+                "category": "Learning"
+            }
+        ]
+
+
+class LocalBackend(GenerationBackend):
+    """Offline backend: extractive explanations and rule-based flashcards from the text itself.
+
+    Deterministic and CPU-only (a few milliseconds for 5000 characters), so
+    it suits free and bulk use where a model call isn't worth the cost.
+    """
+
+    name = 'local'
+
+    def __init__(self, max_cards=10, explanation_chars=400):
+        self.max_cards = max_cards
+        self.explanation_chars = explanation_chars
+
+    def explain(self, text):
+        return f"In simple terms: {summarize(text, self.explanation_chars)}"
+
+    def generate_flashcards(self, text):
+        return flashcard_engine.generate_flashcards(text, max_cards=self.max_cards)
+
+
+# Backends selectable through GENERATION_BACKEND
+BACKENDS = {
+    'fake': lambda: FakeBackend(latency=float(os.getenv('FAKE_GENERATION_LATENCY', '0'))),
+    'local': lambda: LocalBackend(max_cards=int(os.getenv('LOCAL_FLASHCARD_LIMIT', '10')))
+}
+
+
+def create_backend(name):
+    """Instantiate the backend registered under name."""
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown generation backend: {name}")
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight wait for and share its result (or exception).
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key, func, timeout=None):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = concurrent.futures.Future()
+                self._calls[key] = call
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            try:
+                return call.result(timeout=timeout)
+            except concurrent.futures.TimeoutError:
+                raise GenerationTimeout(f"Generation timed out after {timeout}s")
+
+        try:
+            result = func()
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._calls)
+        return {'executed': self.executed, 'coalesced': self.coalesced, 'pending': pending}
+
+
+class GenerationPipeline:
+    """Runs backend calls off the request thread with a concurrency cap and timeout.
+
+    Sync backend methods run on a thread pool and coroutine methods on a
+    dedicated event loop thread. Both are started lazily once per process so
+    the pipeline is safe to create before a preforking server forks.
+    """
+
+    def __init__(self, backend, max_concurrency=8, timeout=30.0, coalesce=True):
+        self.backend = backend
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.coalesce = coalesce
+        self._single_flight = SingleFlight()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._start_lock = threading.Lock()
+        self._pid = None
+        self._executor = None
+        self._loop = None
+        self.in_flight = 0
+        self.completed = 0
+        self.timeouts = 0
+        self.rejected = 0
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_concurrency, thread_name_prefix='generation')
+            self._loop = asyncio.new_event_loop()
+            threading.Thread(target=self._loop.run_forever, name='generation-loop', daemon=True).start()
+            self._pid = os.getpid()
+
+    def submit(self, method, *args):
+        """Start backend.method(*args) and return a concurrent.futures.Future."""
+        self._ensure_started()
+        func = getattr(self.backend, method)
+        if asyncio.iscoroutinefunction(func):
+            return asyncio.run_coroutine_threadsafe(func(*args), self._loop)
+        return self._executor.submit(func, *args)
+
+    def run(self, method, *args, timeout=None):
+        """Call backend.method(*args) and wait for the result.
+
+        Blocks the calling thread until the result is ready or the timeout
+        passes; see the module docstring.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        if not self._slots.acquire(timeout=timeout):
+            self.rejected += 1
+            raise GenerationOverloaded(f"No generation slot available within {timeout}s")
+        try:
+            self.in_flight += 1
+            future = self.submit(method, *args)
+            try:
+                result = future.result(timeout=max(0, deadline - time.monotonic()))
+            except concurrent.futures.TimeoutError:
+                future.cancel()
+                self.timeouts += 1
+                raise GenerationTimeout(f"Generation timed out after {timeout}s")
+            self.completed += 1
+            return result
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    def stream(self, method, *args, timeout=None):
+        """Yield chunks from a generator backend method as they are produced.
+
+        The generation slot is held until the stream finishes or is closed,
+        and the timeout applies to the whole stream.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        if not self._slots.acquire(timeout=timeout):
+            self.rejected += 1
+            raise GenerationOverloaded(f"No generation slot available within {timeout}s")
+        self._ensure_started()
+        self.in_flight += 1
+        func = getattr(self.backend, method)
+        chunks = queue.Queue()
+        stopped = threading.Event()
+
+        if inspect.isasyncgenfunction(func):
+            async def pump():
+                try:
+                    async for chunk in func(*args):
+                        if stopped.is_set():
+                            break
+                        chunks.put(('chunk', chunk))
+                    chunks.put(('done', None))
+                except BaseException as e:
+                    chunks.put(('error', e))
+            future = asyncio.run_coroutine_threadsafe(pump(), self._loop)
+        else:
+            def pump():
+                try:
+                    for chunk in func(*args):
+                        if stopped.is_set():
+                            break
+                        chunks.put(('chunk', chunk))
+                    chunks.put(('done', None))
+                except BaseException as e:
+                    chunks.put(('error', e))
+            future = self._executor.submit(pump)
+
+        try:
+            while True:
+                try:
+                    kind, value = chunks.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    self.timeouts += 1
+                    raise GenerationTimeout(f"Generation timed out after {timeout}s")
+                if kind == 'done':
+                    break
+                if kind == 'error':
+                    raise value
+                yield value
+            self.completed += 1
+        finally:
+            stopped.set()
+            future.cancel()
+            self.in_flight -= 1
+            self._slots.release()
+
+    def stream_explanation(self, text, timeout=None):
+        """Yield explanation chunks, falling back to one chunk for non-streaming backends."""
+        if not hasattr(self.backend, 'stream_explanation'):
+            yield self.explain(text, timeout=timeout)
+            return
+        yield from self.stream('stream_explanation', text, timeout=timeout)
+
+    def run_coalesced(self, method, text, timeout=None):
+        """Like run(), but identical in-flight requests share one backend call."""
+        if not self.coalesce:
+            return self.run(method, text, timeout=timeout)
+        timeout = self.timeout if timeout is None else timeout
+        key = (method, hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest())
+        return self._single_flight.do(key, lambda: self.run(method, text, timeout=timeout),
+                                      timeout=timeout)
+
+    def explain(self, text, timeout=None):
+        return self.run_coalesced('explain', text, timeout=timeout)
+
+    def generate_flashcards(self, text, timeout=None):
+        return self.run_coalesced('generate_flashcards', text, timeout=timeout)
+
+    def stats(self):
+        return {
+            'backend': self.backend.name,
+            'coalescing': self._single_flight.stats(),
+            'max_concurrency': self.max_concurrency,
+            'in_flight': self.in_flight,
+            'completed': self.completed,
+            'timeouts': self.timeouts,
+            'rejected': self.rejected
+        }
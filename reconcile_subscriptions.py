@@ -0,0 +1,229 @@
+"""Reconcile stored subscription data with Stripe in bulk.
+
+Pages through every Stripe subscription, diffs the result against the
+stored users and writes corrections in batches. This
+replaces running /api/fix-subscription for one user at a time.
+
+Usage:
+    python reconcile_subscriptions.py --dry-run --report report.json
+    python reconcile_subscriptions.py --workers 8 --max-writes-per-second 400
+"""
+import argparse
+import concurrent.futures
+import json
+import threading
+import time
+import logging
+
+import stripe
+
+import app as eli5
+from storage import NOW, FirestoreStorage
+
+logger = logging.getLogger('reconcile_subscriptions')
+
+# Preference when a customer has several subscriptions
+STATUS_PRIORITY = {'active': 0, 'trialing': 1, 'past_due': 2, 'unpaid': 3,
+                   'incomplete': 4, 'canceled': 5, 'incomplete_expired': 6}
+
+
+def list_all(resource, max_retries=6, **params):
+    """Yield every object from a Stripe list endpoint, one page at a time.
+
+    Works like auto_paging_iter(), but each page request is retried with
+    exponential backoff when Stripe responds with a rate limit error.
+    """
+    params.setdefault('limit', 100)
+    while True:
+        for attempt in range(max_retries + 1):
+            try:
+                page = resource.list(**params)
+                break
+            except stripe.error.RateLimitError:
+                if attempt == max_retries:
+                    raise
+                delay = 2 ** attempt
+                logger.warning(f"Stripe rate limit hit, retrying in {delay}s")
+                time.sleep(delay)
+        for obj in page.data:
+            yield obj
+        if not page.has_more or not page.data:
+            return
+        params['starting_after'] = page.data[-1].id
+
+
+class RateLimiter:
+    """Token bucket shared by the writer threads."""
+
+    def __init__(self, per_second):
+        self.per_second = per_second
+        self._allowance = per_second
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        # Take the tokens now and sleep off any debt, so requests larger than
+        # one second's budget still go through
+        with self._lock:
+            now = time.monotonic()
+            self._allowance = min(self.per_second,
+                                  self._allowance + (now - self._last) * self.per_second)
+            self._last = now
+            self._allowance -= tokens
+            wait = -self._allowance / self.per_second if self._allowance < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+def load_stripe_subscriptions():
+    """Return {customer_id: subscription}, keeping each customer's best subscription."""
+    best = {}
+    count = 0
+    for subscription in list_all(stripe.Subscription, status='all'):
+        count += 1
+        current = best.get(subscription.customer)
+        rank = (STATUS_PRIORITY.get(subscription.status, 9), -subscription.created)
+        if current is None or rank < (STATUS_PRIORITY.get(current.status, 9), -current.created):
+            best[subscription.customer] = subscription
+    logger.info(f"Loaded {count} Stripe subscriptions for {len(best)} customers")
+    return best
+
+
+def load_users(storage):
+    """Stream the subscription-related fields of every stored user."""
+    users = {}
+    for user_id, user_data in storage.iter_users(['email', 'stripe_customer_id', 'subscription']):
+        users[user_id] = user_data
+    logger.info(f"Loaded {len(users)} {storage.name} users")
+    return users
+
+
+def same_status(current, desired):
+    # The webhook writes 'cancelled', Stripe reports 'canceled'
+    normalize = {'cancelled': 'canceled'}
+    return normalize.get(current, current) == normalize.get(desired, desired)
+
+
+def diff_users(users, subscriptions, match_email=False):
+    """Return (corrections, report) comparing stored users with Stripe.
+
+    corrections is a list of (user_id, customer_id, subscription_id, updates)
+    where updates is a dict of dotted field paths for storage.update_subscriptions.
+    """
+    by_metadata = {}
+    for customer_id, subscription in subscriptions.items():
+        user_id = (subscription.get('metadata') or {}).get('user_id')
+        if user_id:
+            by_metadata[user_id] = customer_id
+
+    by_email = {}
+    if match_email:
+        for customer in list_all(stripe.Customer):
+            if customer.email and customer.id in subscriptions:
+                by_email.setdefault(customer.email.lower(), customer.id)
+
+    corrections = []
+    report = {'checked': len(users), 'unchanged': 0, 'corrected': [],
+              'unmatched_active': [], 'no_stripe_customer': 0}
+
+    for user_id, user_data in users.items():
+        subscription_data = user_data.get('subscription') or {}
+        customer_id = (user_data.get('stripe_customer_id')
+                       or by_metadata.get(user_id)
+                       or by_email.get((user_data.get('email') or '').lower()))
+        subscription = subscriptions.get(customer_id) if customer_id else None
+
+        if subscription is None:
+            if subscription_data.get('status') == 'active' and subscription_data.get('stripe_subscription_id'):
+                report['unmatched_active'].append(user_id)
+            else:
+                report['no_stripe_customer'] += 1
+            continue
+
+        # field path -> [current value, Stripe value]
+        changes = {}
+        if user_data.get('stripe_customer_id') != customer_id:
+            changes['stripe_customer_id'] = [user_data.get('stripe_customer_id'), customer_id]
+        if not same_status(subscription_data.get('status'), subscription.status):
+            changes['subscription.status'] = [subscription_data.get('status'), subscription.status]
+        if subscription_data.get('stripe_subscription_id') != subscription.id:
+            changes['subscription.stripe_subscription_id'] = [
+                subscription_data.get('stripe_subscription_id'), subscription.id]
+        if subscription_data.get('currentPeriodEnd') != subscription.current_period_end:
+            changes['subscription.currentPeriodEnd'] = [
+                subscription_data.get('currentPeriodEnd'), subscription.current_period_end]
+
+        if not changes:
+            report['unchanged'] += 1
+            continue
+
+        report['corrected'].append({'user_id': user_id, 'changes': changes})
+        updates = {field: values[1] for field, values in changes.items()}
+        updates['subscription.plan'] = 'premium'
+        updates['subscription.updated_at'] = NOW
+        corrections.append((user_id, customer_id, subscription.id, updates))
+
+    return corrections, report
+
+
+def apply_corrections(storage, corrections, workers, max_writes_per_second):
+    """Write corrections (user update plus index mappings) in concurrent batches."""
+    limiter = RateLimiter(max_writes_per_second)
+    # Each correction is a user update plus up to two index mappings, and a
+    # chunk should fit in one Firestore batch
+    writes_per_user = 3
+    chunk_size = FirestoreStorage.BATCH_LIMIT // writes_per_user
+
+    def commit_chunk(chunk):
+        limiter.acquire(len(chunk) * writes_per_user)
+        storage.update_subscriptions(chunk)
+        return len(chunk)
+
+    chunks = [corrections[i:i + chunk_size] for i in range(0, len(corrections), chunk_size)]
+    written = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        for count in executor.map(commit_chunk, chunks):
+            written += count
+            logger.info(f"Corrected {written}/{len(corrections)} users")
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--dry-run', action='store_true', help='report differences without writing')
+    parser.add_argument('--report', help='write a JSON report of all differences to this path')
+    parser.add_argument('--match-email', action='store_true',
+                        help='also match users without a customer ID by Stripe customer email')
+    parser.add_argument('--workers', type=int, default=4, help='concurrent batch commits')
+    parser.add_argument('--max-writes-per-second', type=int, default=500,
+                        help='cap on document writes per second')
+    args = parser.parse_args()
+
+    storage = eli5.storage
+    if not storage.available:
+        raise SystemExit("Firestore is not available - check backend/service_acc.json")
+
+    started = time.time()
+    subscriptions = load_stripe_subscriptions()
+    users = load_users(storage)
+    corrections, report = diff_users(users, subscriptions, match_email=args.match_email)
+
+    if args.dry_run:
+        report['written'] = 0
+    else:
+        report['written'] = apply_corrections(storage, corrections, args.workers, args.max_writes_per_second)
+    report['dry_run'] = args.dry_run
+    report['elapsed_seconds'] = round(time.time() - started, 2)
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    print(f"Checked {report['checked']} users: {len(report['corrected'])} to correct, "
+          f"{report['unchanged']} unchanged, {len(report['unmatched_active'])} active without a "
+          f"matching Stripe subscription, {report['written']} written "
+          f"({'dry run' if args.dry_run else 'applied'}) in {report['elapsed_seconds']}s")
+
+
+if __name__ == '__main__':
+    main()
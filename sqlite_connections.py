@@ -0,0 +1,45 @@
+import os
+import sqlite3
+import threading
+
+
+class ThreadLocalConnections:
+    """Lazily opened sqlite3 connections to one file, one per thread and process.
+
+    sqlite3 connections can't be shared between threads or carried across
+    fork, so get() opens a connection for each thread of each process on
+    first use. Nothing is opened until then, so creating the owner does no
+    I/O. pragmas run on every new connection; create_schema(conn) runs on
+    the first one.
+    """
+
+    def __init__(self, path, timeout=10.0, isolation_level='', pragmas=(), create_schema=None):
+        self.path = path
+        self.timeout = timeout
+        self.isolation_level = isolation_level
+        self.pragmas = pragmas
+        self.create_schema = create_schema
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def open(self):
+        """Open a new connection that the caller owns and must close."""
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=self.isolation_level)
+        for pragma in self.pragmas:
+            conn.execute(f'PRAGMA {pragma}')
+        if not self._schema_ready and self.create_schema is not None:
+            with self._schema_lock:
+                if not self._schema_ready:
+                    self.create_schema(conn)
+                    self._schema_ready = True
+        return conn
+
+    def get(self):
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self.open()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
@@ -425,23 +425,32 @@ if (isExtension) {
                 // Get ID token for authentication
                 const idToken = await user.getIdToken();
                 
-                // Call API to fetch flashcards
-                const response = await fetch(`${API_BASE_URL}/api/flashcards?test_premium=true`, {
-                    method: 'GET',
-                    headers: {
-                        'Authorization': `Bearer ${idToken}`
+                // Call API to fetch flashcards, following next_cursor page by page
+                const flashcards = [];
+                let cursor = null;
+                do {
+                    const params = new URLSearchParams({ test_premium: 'true', limit: '500' });
+                    if (cursor) params.set('cursor', cursor);
+
+                    const response = await fetch(`${API_BASE_URL}/api/flashcards?${params}`, {
+                        method: 'GET',
+                        headers: {
+                            'Authorization': `Bearer ${idToken}`
+                        }
+                    });
+
+                    if (!response.ok) {
+                        throw new Error(`Failed to fetch flashcards: ${response.status}`);
                     }
-                });
-                
-                if (!response.ok) {
-                    throw new Error(`Failed to fetch flashcards: ${response.status}`);
-                }
-                
-                const data = await response.json();
-                console.log('Fetched flashcards:', data);
-                
+
+                    const data = await response.json();
+                    flashcards.push(...(data.flashcards || []));
+                    cursor = data.next_cursor;
+                } while (cursor);
+                console.log('Fetched flashcards:', flashcards.length);
+
                 // Update UI with flashcards
-                displayFlashcards(data.flashcards || []);
+                displayFlashcards(flashcards);
             } catch (error) {
                 console.error('Error fetching flashcards:', error);
             }
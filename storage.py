@@ -0,0 +1,626 @@
+import json
+import os
+import time
+import uuid
+import logging
+
+from sqlite_connections import ThreadLocalConnections
+
+logger = logging.getLogger(__name__)
+
+
+class _Now:
+    """Placeholder for 'the time of the write', resolved by each backend."""
+
+    def __repr__(self):
+        return 'NOW'
+
+
+# Use in data passed to storage methods wherever a server timestamp is wanted
+NOW = _Now()
+
+
+class Storage:
+    """Persistence interface for users, flashcards and explanation history.
+
+    Data passed in is plain dicts; NOW marks server timestamps. Flashcards
+    and history entries are returned as dicts including their 'id'.
+    """
+
+    name = 'base'
+
+    @property
+    def available(self):
+        return True
+
+    def ping(self):
+        """Cheap read-only connectivity check; raises on failure."""
+        raise NotImplementedError
+
+    # Users
+
+    def get_user(self, user_id):
+        """Return the user's data, or None if there is no user document."""
+        raise NotImplementedError
+
+    def create_user(self, user_id, data):
+        raise NotImplementedError
+
+    def update_user(self, user_id, fields):
+        """Update top-level fields (or dotted paths) of an existing user."""
+        raise NotImplementedError
+
+    def iter_users(self, fields):
+        """Yield (user_id, data) for every user, limited to fields."""
+        raise NotImplementedError
+
+    # Stripe IDs
+
+    def save_subscription(self, user_id, customer_id, subscription_id, subscription):
+        """Write the user's customer ID and subscription plus both lookup mappings."""
+        raise NotImplementedError
+
+    def update_subscriptions(self, corrections):
+        """Apply (user_id, customer_id, subscription_id, dotted_updates) corrections."""
+        raise NotImplementedError
+
+    def find_stripe_user(self, kind, stripe_id):
+        """Return the user ID for a Stripe 'customer' or 'subscription' ID, or None."""
+        raise NotImplementedError
+
+    # Flashcards
+
+    def list_flashcards(self, user_id, limit, cursor=None, category=None, fields=None):
+        """Return (cards, next_position), newest first.
+
+        cursor and next_position are (created_at, id) tuples; next_position
+        is None on the last page. limit=None returns every matching card.
+        fields limits the returned card fields.
+        """
+        raise NotImplementedError
+
+    def iter_flashcards(self, user_id, since=None, after=None, timeout=None):
+        """Yield cards oldest first, from created_at >= since (skipping ids <= after at since)."""
+        raise NotImplementedError
+
+    def add_flashcard(self, user_id, card, dedup_bands=None, user_exists=None):
+        """Store one card and bump the user's flashcards_version together; return its ID.
+
+        dedup_bands are the card's near-duplicate band keys, stored for
+        find_flashcards_by_bands() but never returned with the card.
+        user_exists is as for add_generated_flashcards().
+        """
+        raise NotImplementedError
+
+    def add_generated_flashcards(self, user_id, cards, dedup_bands=None, user_exists=None):
+        """Store cards and bump flashcards_generated and flashcards_version together; return their IDs.
+
+        Counters are only bumped on existing user documents, never created.
+        Callers that have just confirmed the user document exists pass
+        user_exists=True to save looking it up again. flashcards_version
+        changes with every write to the deck, so it can serve as the deck's
+        version in ETags. dedup_bands, if given, lists each card's band keys
+        in order.
+        """
+        raise NotImplementedError
+
+    def find_flashcards_by_bands(self, user_id, bands, limit):
+        """Return up to limit {'id', 'front', 'back'} cards stored with any of the band keys."""
+        raise NotImplementedError
+
+    # Explanation history
+
+    def add_history(self, entries):
+        """Store [(user_id, [history_item, ...]), ...] and bump existing users' explanations_generated."""
+        raise NotImplementedError
+
+
+class FirestoreStorage(Storage):
+    """Storage on Firestore: users/{uid} with flashcards and explanation_history subcollections."""
+
+    name = 'firestore'
+
+    # Firestore caps a WriteBatch at 500 operations
+    BATCH_LIMIT = 500
+
+    STRIPE_COLLECTIONS = {
+        'customer': ('stripe_customers', 'stripe_customer_id'),
+        'subscription': ('stripe_subscriptions', 'subscription.stripe_subscription_id')
+    }
+
+    # Card field holding the dedup band keys (array-contains-any takes up to 30 values)
+    DEDUP_FIELD = 'dedup_bands'
+    ARRAY_CONTAINS_ANY_LIMIT = 30
+
+    def __init__(self, datastore):
+        from firebase_admin import firestore
+        self._firestore = firestore
+        self.datastore = datastore
+
+    @property
+    def available(self):
+        return self.datastore.available
+
+    def _prepare(self, value):
+        if value is NOW:
+            return self._firestore.SERVER_TIMESTAMP
+        if isinstance(value, dict):
+            return {k: self._prepare(v) for k, v in value.items()}
+        return value
+
+    def _user_ref(self, user_id):
+        return self.datastore.collection('users').document(user_id)
+
+    def _commit(self, writes):
+        """Commit (method, doc_ref, data[, options]) writes in as few batches as possible."""
+        for start in range(0, len(writes), self.BATCH_LIMIT):
+            batch = self.datastore.batch()
+            for method, doc_ref, data, *options in writes[start:start + self.BATCH_LIMIT]:
+                getattr(batch, method)(doc_ref, self._prepare(data), **(options[0] if options else {}))
+            self.datastore.commit(batch)
+
+    def _existing_users(self, user_ids):
+        """Return the subset of user_ids that have a user document (one batched read, no fields)."""
+        refs = [self._user_ref(user_id) for user_id in user_ids]
+        return {doc.id for doc in self.datastore.get_all(refs, field_paths=[]) if doc.exists}
+
+    def _increment(self, user_id, counters, touched_field=None):
+        data = {counter: self._firestore.Increment(amount) for counter, amount in counters.items()}
+        if touched_field:
+            data[touched_field] = NOW
+        return ('set', self._user_ref(user_id), data, {'merge': True})
+
+    def ping(self):
+        # A single document read; the document doesn't need to exist
+        self.datastore.get(self.datastore.collection('health').document('probe'))
+
+    def get_user(self, user_id):
+        user_doc = self.datastore.get(self._user_ref(user_id))
+        return user_doc.to_dict() if user_doc.exists else None
+
+    def create_user(self, user_id, data):
+        self.datastore.set(self._user_ref(user_id), self._prepare(data))
+
+    def update_user(self, user_id, fields):
+        self.datastore.update(self._user_ref(user_id), self._prepare(fields))
+
+    def iter_users(self, fields):
+        query = self.datastore.collection('users').select(list(fields))
+        for user_doc in self.datastore.stream(query, timeout=3600):
+            yield user_doc.id, user_doc.to_dict()
+
+    def _mapping_writes(self, user_id, customer_id, subscription_id):
+        writes = []
+        for kind, stripe_id in (('customer', customer_id), ('subscription', subscription_id)):
+            if stripe_id:
+                collection = self.STRIPE_COLLECTIONS[kind][0]
+                writes.append(('set', self.datastore.collection(collection).document(stripe_id), {
+                    'user_id': user_id,
+                    'updated_at': NOW
+                }))
+        return writes
+
+    def save_subscription(self, user_id, customer_id, subscription_id, subscription):
+        writes = [('update', self._user_ref(user_id), {
+            'stripe_customer_id': customer_id,
+            'subscription': subscription
+        })]
+        writes.extend(self._mapping_writes(user_id, customer_id, subscription_id))
+        self._commit(writes)
+
+    def update_subscriptions(self, corrections):
+        writes = []
+        for user_id, customer_id, subscription_id, updates in corrections:
+            writes.append(('update', self._user_ref(user_id), updates))
+            writes.extend(self._mapping_writes(user_id, customer_id, subscription_id))
+        self._commit(writes)
+
+    def find_stripe_user(self, kind, stripe_id):
+        collection, user_field = self.STRIPE_COLLECTIONS[kind]
+        mapping_doc = self.datastore.get(self.datastore.collection(collection).document(stripe_id))
+        if mapping_doc.exists:
+            return mapping_doc.to_dict().get('user_id')
+
+        # Fall back to scanning users written before the index existed
+        user_docs = self.datastore.query(
+            self.datastore.collection('users').where(user_field, '==', stripe_id).limit(1))
+        if not user_docs:
+            return None
+        user_id = user_docs[0].id
+        self.datastore.set(self.datastore.collection(collection).document(stripe_id),
+                           self._prepare({'user_id': user_id, 'updated_at': NOW}))
+        return user_id
+
+    def list_flashcards(self, user_id, limit, cursor=None, category=None, fields=None):
+        Query = self._firestore.Query
+        flashcards_ref = self._user_ref(user_id).collection('flashcards')
+        query = flashcards_ref
+        if category:
+            query = query.where('category', '==', category)
+        query = query.order_by('created_at', direction=Query.DESCENDING)
+        query = query.order_by('__name__', direction=Query.DESCENDING)
+        if fields is not None:
+            # created_at is always fetched so the next cursor can be built
+            query = query.select(sorted(set(fields) | {'created_at'}))
+        if cursor:
+            query = query.start_after({
+                'created_at': cursor[0],
+                '__name__': flashcards_ref.document(cursor[1])
+            })
+        if limit is not None:
+            # Fetch one extra document to know whether another page exists
+            query = query.limit(limit + 1)
+
+        cards = []
+        next_position = None
+        for card in self.datastore.stream(query):
+            if len(cards) == limit:
+                next_position = (cards[-1].get('created_at'), cards[-1]['id'])
+                break
+            card_data = card.to_dict()
+            card_data.pop(self.DEDUP_FIELD, None)
+            card_data['id'] = card.id
+            cards.append(card_data)
+
+        if fields is not None:
+            keep = set(fields) | {'id'}
+            cards = [{k: v for k, v in card.items() if k in keep} for card in cards]
+        return cards, next_position
+
+    def iter_flashcards(self, user_id, since=None, after=None, timeout=None):
+        flashcards_ref = self._user_ref(user_id).collection('flashcards')
+        query = flashcards_ref.order_by('created_at').order_by('__name__')
+        if since is not None and after:
+            query = query.start_after({'created_at': since, '__name__': flashcards_ref.document(after)})
+        elif since is not None:
+            query = query.start_at({'created_at': since})
+        for card in self.datastore.stream(query, timeout=timeout):
+            card_data = card.to_dict()
+            card_data.pop(self.DEDUP_FIELD, None)
+            card_data['id'] = card.id
+            yield card_data
+
+    def _card_data(self, card, dedup_bands):
+        return dict(card, **{self.DEDUP_FIELD: dedup_bands}) if dedup_bands else card
+
+    def add_flashcard(self, user_id, card, dedup_bands=None, user_exists=None):
+        card_ref = self._user_ref(user_id).collection('flashcards').document()
+        writes = [('set', card_ref, self._card_data(card, dedup_bands))]
+        if user_exists is None:
+            user_exists = bool(self._existing_users([user_id]))
+        if user_exists:
+            writes.append(self._increment(user_id, {'flashcards_version': 1}))
+        self._commit(writes)
+        return card_ref.id
+
+    def add_generated_flashcards(self, user_id, cards, dedup_bands=None, user_exists=None):
+        flashcards_ref = self._user_ref(user_id).collection('flashcards')
+        writes = []
+        ids = []
+        for i, card in enumerate(cards):
+            card_ref = flashcards_ref.document()
+            writes.append(('set', card_ref, self._card_data(card, dedup_bands and dedup_bands[i])))
+            ids.append(card_ref.id)
+        # Update user statistics in the same batch (atomic server-side increment),
+        # without creating a user document for users who don't have one
+        if user_exists is None:
+            user_exists = bool(self._existing_users([user_id]))
+        if user_exists:
+            writes.append(self._increment(user_id, {
+                'flashcards_generated': len(cards),
+                'flashcards_version': 1
+            }, 'last_generation'))
+        self._commit(writes)
+        return ids
+
+    def find_flashcards_by_bands(self, user_id, bands, limit):
+        flashcards_ref = self._user_ref(user_id).collection('flashcards')
+        cards = {}
+        for start in range(0, len(bands), self.ARRAY_CONTAINS_ANY_LIMIT):
+            query = (flashcards_ref
+                     .where(self.DEDUP_FIELD, 'array_contains_any',
+                            list(bands[start:start + self.ARRAY_CONTAINS_ANY_LIMIT]))
+                     .select(['front', 'back'])
+                     .limit(limit))
+            for card in self.datastore.query(query):
+                cards[card.id] = dict(card.to_dict(), id=card.id)
+        return list(cards.values())[:limit]
+
+    def add_history(self, entries):
+        writes = []
+        counts = {}
+        for user_id, history_items in entries:
+            history_ref = self._user_ref(user_id).collection('explanation_history')
+            for history_item in history_items:
+                writes.append(('set', history_ref.document(), history_item))
+            counts[user_id] = counts.get(user_id, 0) + len(history_items)
+
+        # Coalesce stats so each user gets one increment per call; as above,
+        # users without a user document get history but no stub document
+        existing = self._existing_users(counts)
+        for user_id, count in counts.items():
+            if user_id in existing:
+                writes.append(self._increment(user_id, {'explanations_generated': count}, 'last_explanation'))
+        self._commit(writes)
+
+
+class SQLiteStorage(Storage):
+    """Storage in a local SQLite file (WAL mode), for self-hosting, offline use and benchmarks.
+
+    Documents are stored as JSON with the columns needed for lookups and
+    ordering pulled out and indexed by user and created_at.
+    """
+
+    name = 'sqlite'
+
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS users (id TEXT PRIMARY KEY, data TEXT NOT NULL)',
+        'CREATE TABLE IF NOT EXISTS flashcards ('
+        'id TEXT PRIMARY KEY, user_id TEXT NOT NULL, created_at INTEGER, '
+        'category TEXT, data TEXT NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS flashcards_user_created '
+        'ON flashcards (user_id, created_at, id)',
+        'CREATE INDEX IF NOT EXISTS flashcards_user_category_created '
+        'ON flashcards (user_id, category, created_at, id)',
+        'CREATE TABLE IF NOT EXISTS explanation_history ('
+        'id TEXT PRIMARY KEY, user_id TEXT NOT NULL, created_at REAL NOT NULL, data TEXT NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS explanation_history_user_created '
+        'ON explanation_history (user_id, created_at)',
+        'CREATE TABLE IF NOT EXISTS flashcard_bands ('
+        'user_id TEXT NOT NULL, band TEXT NOT NULL, card_id TEXT NOT NULL, '
+        'PRIMARY KEY (user_id, band, card_id))',
+        'CREATE TABLE IF NOT EXISTS stripe_index ('
+        'kind TEXT NOT NULL, stripe_id TEXT NOT NULL, user_id TEXT NOT NULL, '
+        'PRIMARY KEY (kind, stripe_id))'
+    )
+
+    STRIPE_FIELDS = {
+        'customer': 'stripe_customer_id',
+        'subscription': 'subscription.stripe_subscription_id'
+    }
+
+    def __init__(self, path):
+        self.path = path
+        self._connections = ThreadLocalConnections(
+            path, isolation_level=None, pragmas=('journal_mode=WAL', 'synchronous=NORMAL'),
+            create_schema=self._create_schema)
+
+    def _create_schema(self, conn):
+        for statement in self.SCHEMA:
+            conn.execute(statement)
+
+    def _connect(self):
+        return self._connections.get()
+
+    def _transaction(self):
+        return _Transaction(self._connect())
+
+    @staticmethod
+    def _new_id():
+        return uuid.uuid4().hex[:20]
+
+    @classmethod
+    def _resolve(cls, value, now):
+        if value is NOW:
+            return now
+        if isinstance(value, dict):
+            return {k: cls._resolve(v, now) for k, v in value.items()}
+        return value
+
+    @staticmethod
+    def _apply(data, fields):
+        """Apply Firestore-style updates, where dotted keys address nested fields."""
+        for path, value in fields.items():
+            target = data
+            *parents, leaf = path.split('.')
+            for key in parents:
+                if not isinstance(target.get(key), dict):
+                    target[key] = {}
+                target = target[key]
+            target[leaf] = value
+        return data
+
+    def _load_user(self, conn, user_id):
+        row = conn.execute('SELECT data FROM users WHERE id = ?', (user_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _store_user(self, conn, user_id, data):
+        conn.execute('INSERT OR REPLACE INTO users (id, data) VALUES (?, ?)', (user_id, json.dumps(data)))
+
+    def _increment(self, conn, user_id, counters, touched_field, now):
+        data = self._load_user(conn, user_id)
+        if data is None:
+            return
+        for counter, amount in counters.items():
+            data[counter] = data.get(counter, 0) + amount
+        if touched_field:
+            data[touched_field] = now
+        self._store_user(conn, user_id, data)
+
+    def _index_stripe_ids(self, conn, user_id, customer_id, subscription_id):
+        for kind, stripe_id in (('customer', customer_id), ('subscription', subscription_id)):
+            if stripe_id:
+                conn.execute('INSERT OR REPLACE INTO stripe_index (kind, stripe_id, user_id) '
+                             'VALUES (?, ?, ?)', (kind, stripe_id, user_id))
+
+    def ping(self):
+        self._connect().execute('SELECT 1').fetchone()
+
+    def get_user(self, user_id):
+        return self._load_user(self._connect(), user_id)
+
+    def create_user(self, user_id, data):
+        with self._transaction() as conn:
+            self._store_user(conn, user_id, self._resolve(data, time.time()))
+
+    def update_user(self, user_id, fields):
+        with self._transaction() as conn:
+            data = self._load_user(conn, user_id)
+            if data is None:
+                raise LookupError(f"User not found: {user_id}")
+            self._store_user(conn, user_id, self._apply(data, self._resolve(fields, time.time())))
+
+    def iter_users(self, fields):
+        for user_id, raw in self._connect().execute('SELECT id, data FROM users'):
+            data = json.loads(raw)
+            yield user_id, {k: v for k, v in data.items() if k in fields}
+
+    def save_subscription(self, user_id, customer_id, subscription_id, subscription):
+        now = time.time()
+        with self._transaction() as conn:
+            data = self._load_user(conn, user_id)
+            if data is None:
+                raise LookupError(f"User not found: {user_id}")
+            data['stripe_customer_id'] = customer_id
+            data['subscription'] = self._resolve(subscription, now)
+            self._store_user(conn, user_id, data)
+            self._index_stripe_ids(conn, user_id, customer_id, subscription_id)
+
+    def update_subscriptions(self, corrections):
+        now = time.time()
+        with self._transaction() as conn:
+            for user_id, customer_id, subscription_id, updates in corrections:
+                data = self._load_user(conn, user_id)
+                if data is None:
+                    raise LookupError(f"User not found: {user_id}")
+                self._store_user(conn, user_id, self._apply(data, self._resolve(updates, now)))
+                self._index_stripe_ids(conn, user_id, customer_id, subscription_id)
+
+    def find_stripe_user(self, kind, stripe_id):
+        row = self._connect().execute(
+            'SELECT user_id FROM stripe_index WHERE kind = ? AND stripe_id = ?', (kind, stripe_id)
+        ).fetchone()
+        return row[0] if row else None
+
+    def list_flashcards(self, user_id, limit, cursor=None, category=None, fields=None):
+        sql = 'SELECT id, data FROM flashcards WHERE user_id = ?'
+        params = [user_id]
+        if category:
+            sql += ' AND category = ?'
+            params.append(category)
+        if cursor:
+            sql += ' AND (created_at < ? OR (created_at = ? AND id < ?))'
+            params.extend([cursor[0], cursor[0], cursor[1]])
+        sql += ' ORDER BY created_at DESC, id DESC'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit + 1)
+
+        cards = []
+        for card_id, raw in self._connect().execute(sql, params):
+            card = json.loads(raw)
+            card['id'] = card_id
+            cards.append(card)
+
+        next_position = None
+        if limit is not None and len(cards) > limit:
+            cards = cards[:limit]
+            next_position = (cards[-1].get('created_at'), cards[-1]['id'])
+        if fields is not None:
+            keep = set(fields) | {'id'}
+            cards = [{k: v for k, v in card.items() if k in keep} for card in cards]
+        return cards, next_position
+
+    def iter_flashcards(self, user_id, since=None, after=None, timeout=None):
+        sql = 'SELECT id, data FROM flashcards WHERE user_id = ?'
+        params = [user_id]
+        if since is not None and after:
+            sql += ' AND (created_at > ? OR (created_at = ? AND id > ?))'
+            params.extend([since, since, after])
+        elif since is not None:
+            sql += ' AND created_at >= ?'
+            params.append(since)
+        sql += ' ORDER BY created_at, id'
+        # A dedicated connection so the open cursor can't be disturbed by other
+        # queries on this thread while the response streams
+        conn = self._connections.open()
+        try:
+            for card_id, raw in conn.execute(sql, params):
+                card = json.loads(raw)
+                card['id'] = card_id
+                yield card
+        finally:
+            conn.close()
+
+    def _insert_card(self, conn, user_id, card, now, dedup_bands=None):
+        card = self._resolve(card, now)
+        card_id = self._new_id()
+        conn.execute(
+            'INSERT INTO flashcards (id, user_id, created_at, category, data) VALUES (?, ?, ?, ?, ?)',
+            (card_id, user_id, card.get('created_at'), card.get('category'), json.dumps(card))
+        )
+        if dedup_bands:
+            conn.executemany('INSERT OR IGNORE INTO flashcard_bands (user_id, band, card_id) VALUES (?, ?, ?)',
+                             [(user_id, band, card_id) for band in dedup_bands])
+        return card_id
+
+    def add_flashcard(self, user_id, card, dedup_bands=None, user_exists=None):
+        now = time.time()
+        with self._transaction() as conn:
+            card_id = self._insert_card(conn, user_id, card, now, dedup_bands)
+            self._increment(conn, user_id, {'flashcards_version': 1}, None, now)
+        return card_id
+
+    def add_generated_flashcards(self, user_id, cards, dedup_bands=None, user_exists=None):
+        # The user row is read inside the transaction anyway, so user_exists isn't needed
+        now = time.time()
+        with self._transaction() as conn:
+            ids = [self._insert_card(conn, user_id, card, now, dedup_bands and dedup_bands[i])
+                   for i, card in enumerate(cards)]
+            self._increment(conn, user_id, {'flashcards_generated': len(cards), 'flashcards_version': 1},
+                            'last_generation', now)
+        return ids
+
+    def find_flashcards_by_bands(self, user_id, bands, limit):
+        if not bands:
+            return []
+        placeholders = ', '.join('?' * len(bands))
+        rows = self._connect().execute(
+            'SELECT id, data FROM flashcards WHERE id IN ('
+            f'SELECT card_id FROM flashcard_bands WHERE user_id = ? AND band IN ({placeholders})) '
+            'LIMIT ?', [user_id, *bands, limit])
+        cards = []
+        for card_id, raw in rows:
+            card = json.loads(raw)
+            cards.append({'id': card_id, 'front': card.get('front'), 'back': card.get('back')})
+        return cards
+
+    def add_history(self, entries):
+        now = time.time()
+        counts = {}
+        with self._transaction() as conn:
+            for user_id, history_items in entries:
+                for history_item in history_items:
+                    history_item = self._resolve(history_item, now)
+                    conn.execute(
+                        'INSERT INTO explanation_history (id, user_id, created_at, data) VALUES (?, ?, ?, ?)',
+                        (self._new_id(), user_id, now, json.dumps(history_item))
+                    )
+                counts[user_id] = counts.get(user_id, 0) + len(history_items)
+            for user_id, count in counts.items():
+                self._increment(conn, user_id, {'explanations_generated': count}, 'last_explanation', now)
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK around a block, yielding the connection."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+        return False
+
+
+def create_storage(datastore):
+    """Build the backend selected by STORAGE_BACKEND ('firestore' or 'sqlite')."""
+    backend = os.getenv('STORAGE_BACKEND', 'firestore')
+    if backend == 'firestore':
+        return FirestoreStorage(datastore)
+    if backend == 'sqlite':
+        return SQLiteStorage(os.getenv('SQLITE_PATH', 'eli5.sqlite3'))
+    raise ValueError(f"Unknown storage backend: {backend}")
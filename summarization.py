@@ -0,0 +1,140 @@
+import math
+import re
+from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:  # Optional: the pure-Python scorer gives the same result, slower
+    np = None
+
+# Only this much of very long inputs is considered
+MAX_INPUT_CHARS = 200000
+# Vocabulary cap for the scoring matrix (most frequent terms win)
+MAX_TERMS = 2048
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])["\')\]]*\s+(?=["\'(\[]?[A-Z0-9])|\n\s*\n')
+WORD = re.compile(r"[a-z0-9][a-z0-9'-]*")
+
+ABBREVIATIONS = {'mr', 'mrs', 'ms', 'dr', 'prof', 'sr', 'jr', 'st', 'vs', 'etc', 'e.g', 'i.e',
+                 'fig', 'no', 'vol', 'inc', 'ltd', 'co', 'u.s', 'u.k', 'jan', 'feb', 'mar',
+                 'apr', 'jun', 'jul', 'aug', 'sep', 'sept', 'oct', 'nov', 'dec'}
+
+STOPWORDS = frozenset('''
+a about above after again against all also am an and any are as at be because been before being
+below between both but by can could did do does doing down during each few for from further had
+has have having he her here hers herself him himself his how i if in into is it its itself just
+me more most my myself no nor not now of off on once only or other our ours ourselves out over
+own same she should so some such than that the their theirs them themselves then there these they
+this those through to too under until up very was we were what when where which while who whom
+why will with would you your yours yourself yourselves said says one two new may many much
+'''.split())
+
+
+def split_sentences(text):
+    """Split text into sentences, keeping common abbreviations intact."""
+    sentences = []
+    pending = ''
+    for piece in SENTENCE_BOUNDARY.split(text):
+        if not piece or not piece.strip():
+            continue
+        piece = ' '.join(piece.split())
+        pending = f'{pending} {piece}' if pending else piece
+        last_word = pending.rsplit(' ', 1)[-1].rstrip('.').lower()
+        if last_word in ABBREVIATIONS or (len(last_word) == 1 and last_word.isalpha()):
+            continue
+        sentences.append(pending)
+        pending = ''
+    if pending:
+        sentences.append(pending)
+    return sentences
+
+
+def tokenize(sentence):
+    return [w for w in WORD.findall(sentence.lower()) if len(w) > 2 and w not in STOPWORDS]
+
+
+def _centroid_scores(token_lists):
+    """Cosine similarity of each sentence's TF-IDF vector to the document centroid."""
+    document_frequency = Counter()
+    for tokens in token_lists:
+        document_frequency.update(set(tokens))
+    vocabulary = {term: i for i, (term, _) in enumerate(document_frequency.most_common(MAX_TERMS))}
+    count = len(token_lists)
+    idf = {term: math.log((1 + count) / (1 + document_frequency[term])) + 1 for term in vocabulary}
+
+    if np is not None:
+        matrix = np.zeros((count, len(vocabulary)), dtype=np.float32)
+        for row, tokens in enumerate(token_lists):
+            for term in tokens:
+                column = vocabulary.get(term)
+                if column is not None:
+                    matrix[row, column] += 1
+        matrix *= np.array([idf[term] for term in vocabulary], dtype=np.float32)
+        centroid = matrix.sum(axis=0)
+        norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(centroid) or 1.0)
+        norms[norms == 0] = 1.0
+        return (matrix @ centroid / norms).tolist()
+
+    vectors = []
+    centroid = Counter()
+    for tokens in token_lists:
+        vector = Counter()
+        for term in tokens:
+            if term in idf:
+                vector[term] += idf[term]
+        vectors.append(vector)
+        centroid.update(vector)
+    centroid_norm = math.sqrt(sum(v * v for v in centroid.values())) or 1.0
+    scores = []
+    for vector in vectors:
+        norm = math.sqrt(sum(v * v for v in vector.values()))
+        if not norm:
+            scores.append(0.0)
+            continue
+        scores.append(sum(weight * centroid[term] for term, weight in vector.items()) / (norm * centroid_norm))
+    return scores
+
+
+def summarize(text, max_chars=5000):
+    """Return text shortened to at most max_chars by keeping its most informative sentences.
+
+    Sentences are scored by TF-IDF similarity to the whole document, with a
+    small bonus for the opening sentences, and picked best first (skipping
+    near-repeats) until the budget is used. They are returned in their
+    original order. Text already within the budget is returned unchanged.
+    """
+    if len(text) <= max_chars:
+        return text
+    sentences = split_sentences(text[:MAX_INPUT_CHARS])
+    token_lists = [tokenize(sentence) for sentence in sentences]
+    scores = _centroid_scores(token_lists) if sentences else []
+
+    ranked = []
+    for index, score in enumerate(scores):
+        if index < 3:
+            score *= 1.2
+        if len(token_lists[index]) < 4:
+            score *= 0.5
+        ranked.append((score, index))
+    ranked.sort(key=lambda item: (-item[0], item[1]))
+
+    chosen = []
+    chosen_terms = []
+    used = 0
+    for score, index in ranked:
+        sentence = sentences[index]
+        if used + len(sentence) > max_chars:
+            continue
+        terms = set(token_lists[index])
+        if terms and any(len(terms & other) / len(terms | other) > 0.8 for other in chosen_terms):
+            continue
+        chosen.append(index)
+        chosen_terms.append(terms)
+        used += len(sentence) + 1
+        if max_chars - used < 40:
+            break
+
+    if not chosen:
+        # No sentence fits (e.g. one enormous run-on): fall back to truncation
+        return text[:max_chars]
+    return ' '.join(sentences[index] for index in sorted(chosen))
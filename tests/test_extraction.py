@@ -0,0 +1,40 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extraction import extract_main_text
+
+ARTICLE = ('Photosynthesis converts light energy into chemical energy, which plants store as sugar. '
+           'It takes place in the chloroplasts, using water and carbon dioxide, and releases oxygen.')
+
+
+def test_omitted_head_end_tag_keeps_body():
+    html = f'<html><head><title>Plants</title><body><p>{ARTICLE}</p></body></html>'
+    assert ARTICLE in extract_main_text(html)
+
+
+def test_omitted_head_and_body_tags_keep_content():
+    html = f'<html><head><title>Plants</title><meta charset="utf-8"><p>{ARTICLE}</p></html>'
+    assert ARTICLE in extract_main_text(html)
+
+
+def test_form_wrapping_the_body_keeps_content():
+    html = ('<html><head><title>Plants</title></head><body>'
+            '<form method="post" action="./Default.aspx" id="aspnetForm">'
+            '<input type="hidden" name="__VIEWSTATE" value="abc">'
+            f'<div id="content"><p>{ARTICLE}</p></div>'
+            '<button type="submit">Search</button>'
+            '</form></body></html>')
+    text = extract_main_text(html)
+    assert ARTICLE in text
+    assert 'Search' not in text
+
+
+def test_head_contents_are_not_content():
+    html = (f'<html><head><title>Plants</title><style>p {{ color: red; }}</style>'
+            f'<script>var tracking = "a long string of tracking code, not content.";</script>'
+            f'</head><body><p>{ARTICLE}</p></body></html>')
+    text = extract_main_text(html)
+    assert 'color' not in text
+    assert 'tracking' not in text
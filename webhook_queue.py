@@ -0,0 +1,198 @@
+import os
+import threading
+import time
+import logging
+
+from sqlite_connections import ThreadLocalConnections
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookQueue:
+    """Durable queue of verified Stripe webhook events in a local SQLite file.
+
+    enqueue() stores the raw event keyed by its Stripe event ID, so retries and
+    duplicate deliveries of the same event are ignored. A pool of worker
+    threads claims pending events and passes them to handler(event_id, payload).
+    A failed event is retried with exponential backoff (retry_delay doubling
+    up to max_retry_delay) up to max_attempts and then marked 'failed'; a
+    later redelivery of a failed event queues it again. Events claimed by a
+    worker that died are reclaimed after visibility_timeout seconds. Several
+    processes can share one file.
+    """
+
+    def __init__(self, path, handler, workers=2, max_attempts=10, retry_delay=30,
+                 max_retry_delay=3600, poll_interval=1.0, visibility_timeout=300,
+                 retention=7 * 86400):
+        self.path = path
+        self.handler = handler
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.poll_interval = poll_interval
+        self.visibility_timeout = visibility_timeout
+        self.retention = retention
+        self._last_prune = 0
+        self._connections = ThreadLocalConnections(path, isolation_level=None,
+                                                   create_schema=self._create_schema)
+        self._wakeup = threading.Event()
+        self._start_lock = threading.Lock()
+        self._pid = None
+        self.processed = 0
+        self.retried = 0
+        self.failed = 0
+        self.duplicates = 0
+
+    def _create_schema(self, conn):
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS webhook_events ('
+            'event_id TEXT PRIMARY KEY, '
+            'type TEXT, '
+            'payload TEXT NOT NULL, '
+            "status TEXT NOT NULL DEFAULT 'pending', "
+            'attempts INTEGER NOT NULL DEFAULT 0, '
+            'available_at REAL NOT NULL, '
+            'received_at REAL NOT NULL, '
+            'updated_at REAL NOT NULL, '
+            'last_error TEXT)'
+        )
+        conn.execute(
+            'CREATE INDEX IF NOT EXISTS webhook_events_ready '
+            'ON webhook_events (status, available_at)'
+        )
+
+    def _connect(self):
+        return self._connections.get()
+
+    def start(self):
+        """Start the worker threads (once per process)."""
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            for i in range(self.workers):
+                threading.Thread(target=self._run, name=f'webhook-worker-{i}', daemon=True).start()
+            self._pid = os.getpid()
+
+    def enqueue(self, event_id, event_type, payload):
+        """Durably store an event. Returns False if it was already queued.
+
+        An event that previously ran out of attempts is reset to pending, so
+        Stripe's own redeliveries (which continue for days) get another go.
+        """
+        now = time.time()
+        cursor = self._connect().execute(
+            'INSERT INTO webhook_events '
+            '(event_id, type, payload, available_at, received_at, updated_at) '
+            'VALUES (?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT(event_id) DO UPDATE SET '
+            "status = 'pending', attempts = 0, payload = excluded.payload, "
+            'available_at = excluded.available_at, updated_at = excluded.updated_at, '
+            "last_error = NULL WHERE status = 'failed'",
+            (event_id, event_type, payload, now, now, now)
+        )
+        self.start()
+        if cursor.rowcount == 0:
+            self.duplicates += 1
+            return False
+        self._wakeup.set()
+        return True
+
+    def _claim(self):
+        """Atomically mark the next ready event as processing and return it."""
+        now = time.time()
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT event_id, payload, attempts FROM webhook_events '
+                "WHERE (status = 'pending' AND available_at <= ?) "
+                "OR (status = 'processing' AND updated_at <= ?) "
+                'ORDER BY received_at LIMIT 1',
+                (now, now - self.visibility_timeout)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE webhook_events SET status = 'processing', attempts = attempts + 1, "
+                    'updated_at = ? WHERE event_id = ?', (now, row[0])
+                )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return row
+
+    def _finish(self, event_id, attempts, error=None):
+        now = time.time()
+        if error is None:
+            status, available_at = 'done', now
+            self.processed += 1
+        elif attempts >= self.max_attempts:
+            status, available_at = 'failed', now
+            self.failed += 1
+        else:
+            # Exponential backoff: retry_delay, doubling up to max_retry_delay
+            delay = min(self.retry_delay * 2 ** (attempts - 1), self.max_retry_delay)
+            status, available_at = 'pending', now + delay
+            self.retried += 1
+        self._connect().execute(
+            'UPDATE webhook_events SET status = ?, available_at = ?, updated_at = ?, '
+            'last_error = ? WHERE event_id = ?',
+            (status, available_at, now, error, event_id)
+        )
+
+    def _run(self):
+        while True:
+            try:
+                row = self._claim()
+            except Exception as e:
+                logger.error(f"Webhook queue claim error: {str(e)}")
+                row = None
+            if row is None:
+                if time.time() - self._last_prune > 3600:
+                    self.prune()
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            event_id, payload, attempts = row
+            attempts += 1
+            try:
+                self.handler(event_id, payload)
+            except Exception as e:
+                logger.error(f"Error processing webhook event {event_id} (attempt {attempts}): {str(e)}")
+                self._finish(event_id, attempts, error=str(e))
+            else:
+                self._finish(event_id, attempts)
+
+    def prune(self):
+        """Delete finished events older than the retention window.
+
+        Event IDs are kept for longer than Stripe's retry window so late
+        duplicates are still recognised.
+        """
+        self._last_prune = time.time()
+        try:
+            self._connect().execute(
+                "DELETE FROM webhook_events WHERE status = 'done' AND updated_at < ?",
+                (time.time() - self.retention,)
+            )
+        except Exception as e:
+            logger.error(f"Webhook queue prune error: {str(e)}")
+
+    def stats(self):
+        counts = dict(self._connect().execute(
+            'SELECT status, COUNT(*) FROM webhook_events GROUP BY status'
+        ).fetchall())
+        return {
+            'pending': counts.get('pending', 0),
+            'processing': counts.get('processing', 0),
+            'done': counts.get('done', 0),
+            'failed': counts.get('failed', 0),
+            'processed': self.processed,
+            'retried': self.retried,
+            'duplicates': self.duplicates
+        }